@@ -0,0 +1,182 @@
+"""
+Compare the client side CPU cost of the wire codecs on synthetic results of the heavy commands
+(process.list, corex.list, kvm.list, aggregator.query).
+
+A job result is a json object whose `data` field is itself a json string, so decoding a result costs
+two loads. The json and orjson codecs both speak json (zero-os only speaks json), but their bytes differ:
+orjson output is compact utf-8 while the json module adds spaces and escapes non ascii characters, so the
+sizes are reported per codec. msgpack and zlib compressed json are only reported as a reference of what a
+binary or compressed protocol would save.
+
+usage:
+    python3 benchmarks/codec.py [--scale N] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import codec as codecs  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def process_list(scale):
+    return [{
+        'pid': i,
+        'ppid': 1,
+        'cmdline': '/usr/bin/some-daemon --config /etc/daemon/{}.toml --verbose'.format(i),
+        'createtime': 1530000000000 + i,
+        'cpu': 0.5,
+        'rss': 1024 * i,
+        'vms': 4096 * i,
+        'swap': 0,
+    } for i in range(50 * scale)]
+
+
+def corex_list(scale):
+    return {str(i): {
+        'pid': 1000 + i,
+        'cpu': 1.5,
+        'rss': 1024 * 1024,
+        'vms': 4 * 1024 * 1024,
+        'swap': 0,
+        'container': {
+            'arguments': {
+                'root': 'https://hub.grid.tf/tf-official-apps/ubuntu-bionic.flist',
+                'mount': {'/var/cache/{}'.format(i): '/data'},
+                'host_network': False,
+                'nics': [{'type': 'default', 'state': 'configured'}],
+                'port': {'{}'.format(8000 + i): 80},
+                'privileged': False,
+                'hostname': 'container-{}'.format(i),
+                'storage': 'zdb://hub.grid.tf:9900',
+                'name': 'container-{}'.format(i),
+                'tags': ['app', 'tenant-{}'.format(i % 10)],
+                'env': {'HOME': '/root', 'PATH': '/usr/bin:/bin'},
+            },
+            'root': '/mnt/containers/{}'.format(i),
+            'pid': 1000 + i,
+        },
+    } for i in range(20 * scale)}
+
+
+def kvm_list(scale):
+    return [{
+        'id': i,
+        'uuid': '7d4b6e5c-0000-4000-8000-{:012d}'.format(i),
+        'name': 'vm-{}'.format(i),
+        'state': 'running',
+        'vnc': 5900 + i,
+        'tags': ['vm', 'tenant-{}'.format(i % 10)],
+        'params': {
+            'cpu': 2,
+            'memory': 2048,
+            'media': [{'url': 'zdb://hub.grid.tf:9900/vm-{}'.format(i), 'type': 'disk', 'iotune': None}],
+            'nics': [{'type': 'bridge', 'id': 'br0', 'hwaddr': '52:54:00:00:00:{:02x}'.format(i % 256)}],
+            'port': {},
+        },
+    } for i in range(10 * scale)]
+
+
+def aggregator_query(scale):
+    return {'machine.CPU.percent/{}'.format(i): {
+        'current': {
+            '300': {'avg': 10.5, 'max': 90.1, 'min': 0.1, 'start': 1530000000, 'total': 3150.2, 'count': 300},
+            '3600': {'avg': 12.5, 'max': 99.1, 'min': 0.0, 'start': 1530000000, 'total': 45000.1, 'count': 3600},
+        },
+        'tags': 'id={} type=phys'.format(i),
+    } for i in range(200 * scale)}
+
+
+COMMANDS = {
+    'process.list': process_list,
+    'corex.list': corex_list,
+    'kvm.list': kvm_list,
+    'aggregator.query': aggregator_query,
+}
+
+
+def result_body(data):
+    return json.dumps({
+        'id': 'bench', 'command': 'bench', 'state': 'SUCCESS', 'code': 0, 'level': 20,
+        'data': json.dumps(data), 'streams': ['', ''], 'starttime': 1530000000000, 'time': 10,
+    }).encode()
+
+
+def timeit(fn, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - start) / rounds * 1000
+
+
+def measure(command, data, rounds):
+    body = result_body(data)
+    rows = []
+    for name in codecs.available():
+        codec = codecs.get(name)
+        rows.append({
+            'command': command,
+            'codec': name,
+            'bytes': len(body),
+            'decode_ms': timeit(lambda: codec.loads(codec.loads(body)['data']), rounds),
+            'encode_ms': timeit(lambda: codec.dumps(data), rounds),
+            'reference': False,
+        })
+
+    if msgpack is not None:
+        packed = msgpack.packb(data)
+        rows.append({
+            'command': command,
+            'codec': 'msgpack',
+            'bytes': len(packed),
+            'decode_ms': timeit(lambda: msgpack.unpackb(packed, raw=False, strict_map_key=False), rounds),
+            'encode_ms': timeit(lambda: msgpack.packb(data), rounds),
+            'reference': True,
+        })
+
+    compressed = zlib.compress(body)
+    rows.append({
+        'command': command,
+        'codec': 'json+deflate',
+        'bytes': len(compressed),
+        'decode_ms': timeit(lambda: json.loads(json.loads(zlib.decompress(compressed).decode())['data']), rounds),
+        'encode_ms': timeit(lambda: zlib.compress(json.dumps(data).encode()), rounds),
+        'reference': True,
+    })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10, help='size multiplier of the synthetic results')
+    parser.add_argument('--rounds', type=int, default=20, help='rounds per measurement')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    options = parser.parse_args()
+
+    rows = []
+    for command, generate in COMMANDS.items():
+        rows.extend(measure(command, generate(options.scale), options.rounds))
+
+    if options.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print('{:<18} {:<14} {:>10} {:>11} {:>11}'.format('command', 'codec', 'bytes', 'decode ms', 'encode ms'))
+    for row in rows:
+        print('{:<18} {:<14} {:>10} {:>11.3f} {:>11.3f}{}'.format(
+            row['command'], row['codec'], row['bytes'], row['decode_ms'], row['encode_ms'],
+            '  (reference)' if row['reference'] else '',
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Throughput and latency percentiles of the client hot paths, measured end to end against a fake node
+(zeroos.core0.client.fakenode) so it runs without Zero-OS.
+
+- raw: Client.raw submission (queue the job and wait for the queued flag)
+- get: Client.raw + Response.get round trip
+- stream: Response.stream of a job with a lot of output
+- json: BaseClient.json of large list results, and the decoding alone
+- typchk: typchk.Checker.check on the real manager schemas
+- transfer: FilesystemManager.upload/download at several chunk sizes
+
+The fake node uses an embedded redis (fakeredis) unless --redis host:port points to a local redis-server,
+which gives numbers closer to a real node. Use --json or --output to get machine readable results that can
+be compared between releases.
+
+usage:
+    python3 benchmarks/hotpaths.py [--redis host:port] [--count N] [--only raw,get,...] [--json] [--output file]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import Client  # noqa: E402
+from zeroos.core0.client.client import BaseClient, ContainerManager, KvmManager  # noqa: E402
+from zeroos.core0.client.fakenode import FakeNode  # noqa: E402
+
+
+def stats(samples, unit=1):
+    """
+    Summary of a list of durations in seconds
+
+    :param unit: number of operations done per sample (for the throughput)
+    """
+    samples = sorted(samples)
+    total = sum(samples)
+
+    def percentile(q):
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))] * 1000
+
+    return {
+        'count': len(samples),
+        'ops_per_sec': len(samples) * unit / total if total else 0,
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+    }
+
+
+def timed(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_raw(node, cl, count):
+    responses = []
+    samples = timed(lambda: responses.append(cl.raw('core.ping', {})), count)
+    for response in responses:
+        response.get()
+    return {'raw': stats(samples)}
+
+
+def bench_get(node, cl, count):
+    return {'get': stats(timed(lambda: cl.raw('core.ping', {}).get(), count))}
+
+
+def bench_stream(node, cl, count):
+    lines = 10000
+    node._sizes['lines'] = lines
+    try:
+        samples = timed(lambda: cl.system('build', stream=True).stream(callback=lambda *args: None), max(1, count // 100))
+    finally:
+        node._sizes['lines'] = 10
+    return {'stream': stats(samples, unit=lines)}
+
+
+def bench_json(node, cl, count):
+    results = {}
+    count = max(1, count // 10)
+    for command in ('process.list', 'corex.list', 'kvm.list', 'aggregator.query'):
+        results['json/{}'.format(command)] = stats(timed(lambda: cl.json(command, {}), count))
+        data = cl.sync(command, {}).data
+        results['decode/{}'.format(command)] = stats(timed(lambda: cl.codec.loads(data), count))
+    return results
+
+
+def bench_typchk(node, cl, count):
+    schemas = {
+        'raw': (Client._raw_chk, {
+            'id': 'b3f4e79e-8c2b-4b6e-9fa3-4c2c4b1f0a11',
+            'command': 'core.system',
+            'arguments': {'name': 'ls', 'args': ['-l'], 'dir': '', 'stdin': '', 'env': None},
+            'queue': None,
+            'max_time': None,
+            'stream': False,
+            'tags': None,
+            'recurring_period': None,
+        }),
+        'system': (BaseClient._system_chk, {
+            'name': 'ls', 'args': ['-l', '/root'], 'dir': '', 'stdin': '', 'env': {'HOME': '/root'},
+        }),
+        'container.create': (ContainerManager._create_chk, {
+            'root': 'https://hub.grid.tf/tf-official-apps/ubuntu-bionic.flist',
+            'mount': {'/var/cache/app': '/data'},
+            'host_network': False,
+            'nics': [{'type': 'default'}, {'type': 'bridge', 'id': 'br0', 'config': {'dhcp': True}}],
+            'port': {8080: 80},
+            'hostname': 'app',
+            'privileged': False,
+            'storage': None,
+            'name': 'app',
+            'identity': None,
+            'env': {'HOME': '/root'},
+            'cgroups': [('cpuset', 'app')],
+        }),
+        'kvm.create': (KvmManager._create_chk, {
+            'name': 'vm',
+            'media': None,
+            'flist': 'https://hub.grid.tf/tf-official-apps/ubuntu-bionic.flist',
+            'cmdline': None,
+            'share_cache': False,
+            'kvm': False,
+            'cpu': 2,
+            'memory': 2048,
+            'nics': [{'type': 'default'}],
+            'port': {2222: 22},
+            'mount': None,
+            'tags': ['vm'],
+            'config': None,
+            'storage': None,
+        }),
+    }
+
+    results = {}
+    for name, (checker, obj) in schemas.items():
+        checker.check(obj)
+        batch = 100
+        samples = timed(lambda: [checker.check(obj) for _ in range(batch)], max(1, count // 10))
+        results['typchk/{}'.format(name)] = stats(samples, unit=batch)
+    return results
+
+
+def bench_transfer(node, cl, count):
+    size = 16 * 1024 * 1024
+    data = os.urandom(size)
+    results = {}
+    for chunk in (64 * 1024, 512 * 1024, 2 * 1024 * 1024):
+        for window in (1, 4):
+            name = 'upload/{}k/w{}'.format(chunk // 1024, window)
+            samples = timed(lambda: cl.filesystem.upload('/bench', io.BytesIO(data), window=window, chunk_size=chunk), 3)
+            results[name] = stats(samples, unit=size / (1024 * 1024))
+
+    for window in (1, 4):
+        name = 'download/512k/w{}'.format(window)
+        samples = timed(lambda: cl.filesystem.download('/bench', io.BytesIO(), window=window), 3)
+        results[name] = stats(samples, unit=size / (1024 * 1024))
+    return results
+
+
+BENCHMARKS = {
+    'raw': bench_raw,
+    'get': bench_get,
+    'stream': bench_stream,
+    'json': bench_json,
+    'typchk': bench_typchk,
+    'transfer': bench_transfer,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis', help='host:port of a local redis-server (default to an embedded redis)')
+    parser.add_argument('--count', type=int, default=1000, help='number of operations per benchmark')
+    parser.add_argument('--only', help='comma separated list of benchmarks to run ({})'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    parser.add_argument('--output', help='write the json results to this file')
+    options = parser.parse_args()
+
+    kwargs = {}
+    if options.redis:
+        host, _, port = options.redis.partition(':')
+        kwargs.update(host=host, port=int(port or 6379))
+
+    names = options.only.split(',') if options.only else list(BENCHMARKS)
+    results = {}
+    with FakeNode(**kwargs) as node:
+        cl = node.client()
+        for name in names:
+            results.update(BENCHMARKS[name](node, cl, options.count))
+
+    report = {
+        'python': platform.python_version(),
+        'codec': cl.codec.name,
+        'redis': options.redis or 'embedded',
+        'results': results,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print('{:<28} {:>8} {:>12} {:>10} {:>10} {:>10}'.format('benchmark', 'count', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, result in results.items():
+        print('{:<28} {:>8} {:>12.1f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            name, result['count'], result['ops_per_sec'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+        ))
+    print('\ntransfer ops/s are MiB/s, stream ops/s are lines/s, typchk ops/s are checks/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure the memory kept by job results and responses, as paid by tools that keep a lot of them
+around (audit trails, job tracking).
+
+- legacy: a plain object holding the decoded result payload (how Return stored results before)
+- lazy: Return created from the raw result body, never accessed
+- accessed: Return created from the raw result body after reading one of its fields
+
+usage:
+    python3 benchmarks/memory.py [--count N] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client.client import Return, Response  # noqa: E402
+
+
+class LegacyReturn:
+    def __init__(self, payload):
+        self._payload = payload
+
+
+class LegacyResponse:
+    def __init__(self, client, id):
+        self._client = client
+        self._id = id
+        self._queue = 'result:{}'.format(id)
+
+
+def body(i):
+    return json.dumps({
+        'id': str(uuid.uuid4()),
+        'command': 'core.system',
+        'data': '',
+        'streams': ['output line {}\n'.format(i), ''],
+        'critical': '',
+        'level': 0,
+        'state': 'SUCCESS',
+        'code': 0,
+        'starttime': 1530000000000 + i,
+        'time': 12,
+        'tags': None,
+        'container': 0,
+    }).encode()
+
+
+def measure(build, count):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [build(i) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del objects
+    return used
+
+
+def accessed(i):
+    r = Return(body=body(i))
+    r.state
+    return r
+
+
+CASES = {
+    'return/legacy': lambda i: LegacyReturn(json.loads(body(i).decode())),
+    'return/lazy': lambda i: Return(body=body(i)),
+    'return/accessed': accessed,
+    'response/legacy': lambda i: LegacyResponse(None, str(uuid.uuid4())),
+    'response/slots': lambda i: Response(None, str(uuid.uuid4())),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000, help='number of objects to keep per case')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    options = parser.parse_args()
+
+    results = []
+    for name, build in CASES.items():
+        used = measure(build, options.count)
+        results.append({
+            'case': name,
+            'total_bytes': used,
+            'bytes_per_object': used / options.count,
+        })
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<18} {:>14} {:>14}'.format('case', 'total MiB', 'bytes/object'))
+    for result in results:
+        print('{:<18} {:>14.1f} {:>14.0f}'.format(
+            result['case'], result['total_bytes'] / (1024 * 1024), result['bytes_per_object'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
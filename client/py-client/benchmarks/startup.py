@@ -0,0 +1,71 @@
+"""
+Measure the client startup cost: import of zeroos.core0.client and construction of a Client
+(without the connection test), as paid by short lived tools that create a client per invocation.
+
+Each run is done in a fresh interpreter.
+
+usage:
+    python3 benchmarks/startup.py [--runs N] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCRIPT = """
+import json, time
+start = time.perf_counter()
+import zeroos.core0.client as c
+imported = time.perf_counter()
+cl = c.Client('127.0.0.1', testConnectionAttempts=0)
+constructed = time.perf_counter()
+cl.container
+accessed = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'construct': constructed - imported,
+    'first_manager_access': accessed - constructed,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='number of fresh interpreters to measure')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    options = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+
+    samples = []
+    for _ in range(options.runs):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT], env=env)
+        samples.append(json.loads(output.decode()))
+
+    results = {}
+    for key in samples[0]:
+        values = [sample[key] * 1000 for sample in samples]
+        results[key] = {
+            'median_ms': statistics.median(values),
+            'min_ms': min(values),
+            'max_ms': max(values),
+        }
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<22} {:>10} {:>10} {:>10}'.format('phase', 'median ms', 'min ms', 'max ms'))
+    for key, result in results.items():
+        print('{:<22} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            key, result['median_ms'], result['min_ms'], result['max_ms'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the client side cost of a job submission (Client.raw without the network round trips): building and
+validating the payload, generating the job id, serializing the payload and the debug log line.
+
+The previous implementation (uuid4 ids, checker walking the schema, json serialization, debug line always
+formatted) is measured next to the current one.
+Use benchmarks/hotpaths.py for the end to end numbers.
+
+usage:
+    python3 benchmarks/submit.py [--count N] [--debug] [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import Client, typchk  # noqa: E402
+from zeroos.core0.client.client import dumps, logger  # noqa: E402
+
+ARGUMENTS = {
+    'name': 'ls',
+    'args': ['-l', '/root'],
+    'dir': '',
+    'stdin': '',
+    'env': {'HOME': '/root', 'PATH': '/bin:/usr/bin'},
+}
+
+
+def previous(cl):
+    payload = {
+        'id': str(uuid.uuid4()),
+        'command': 'core.system',
+        'arguments': ARGUMENTS,
+        'queue': None,
+        'max_time': None,
+        'stream': False,
+        'tags': None,
+        'recurring_period': None
+    }
+    cl._raw_chk._check(cl._raw_chk._typ, payload, typchk.Tracker([]).push('/'))
+    json.dumps(payload).encode()
+    logger.debug('%s >> g8core.%s(%s)', payload['id'], payload['command'],
+                 ', '.join(("%s=%s" % (k, v) for k, v in payload['arguments'].items())))
+
+
+def current(cl):
+    payload = cl._payload('core.system', ARGUMENTS)
+    dumps(payload, cl.codec)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s >> g8core.%s(%s)', payload['id'], payload['command'],
+                     ', '.join(("%s=%s" % (k, v) for k, v in payload['arguments'].items())))
+
+
+def measure(fn, cl, count):
+    for _ in range(min(count, 1000)):
+        fn(cl)
+    start = time.perf_counter()
+    for _ in range(count):
+        fn(cl)
+    return (time.perf_counter() - start) / count * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000, help='number of submissions to measure')
+    parser.add_argument('--debug', action='store_true', help='measure with debug logging enabled')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    options = parser.parse_args()
+
+    if options.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+
+    cl = Client('127.0.0.1', testConnectionAttempts=0)
+    results = {
+        'previous_us': measure(previous, cl, options.count),
+        'current_us': measure(current, cl, options.count),
+    }
+    results['speedup'] = results['previous_us'] / results['current_us']
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<12} {:>12}'.format('', 'us/submit'))
+    print('{:<12} {:>12.2f}'.format('previous', results['previous_us']))
+    print('{:<12} {:>12.2f}'.format('current', results['current_us']))
+    print('speedup {:.2f}x'.format(results['speedup']))
+
+
+if __name__ == '__main__':
+    main()
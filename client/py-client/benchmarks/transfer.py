@@ -0,0 +1,124 @@
+"""
+Compare the client side cost of the filesystem transfer encoding
+
+- legacy: base64.encodebytes + json.dumps of the str block (the encoding used before blocks)
+- block: zeroos.core0.client.client.Block spliced into the payload bytes by dumps
+
+Each path runs in its own process so the reported peak RSS is not polluted by the other one.
+
+usage:
+    python3 benchmarks/transfer.py [--size MiB] [--chunk KiB] [--json]
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client.client import Block, dumps  # noqa: E402
+
+
+def envelope(block):
+    return {
+        'id': 'bench',
+        'command': 'filesystem.write',
+        'arguments': {'fd': 'bench', 'block': block},
+        'queue': None,
+        'max_time': None,
+        'stream': False,
+        'tags': None,
+        'recurring_period': None,
+    }
+
+
+def legacy_encode(chunk):
+    return json.dumps(envelope(base64.encodebytes(chunk).decode())).encode()
+
+
+def block_encode(chunk):
+    return dumps(envelope(Block(chunk)))
+
+
+def legacy_decode(body):
+    result = json.loads(body.decode())
+    return base64.decodebytes(json.loads(result['data']).encode())
+
+
+def block_decode(body):
+    result = json.loads(body.decode())
+    return base64.b64decode(json.loads(result['data']))
+
+
+PATHS = {
+    'legacy': (legacy_encode, legacy_decode),
+    'block': (block_encode, block_decode),
+}
+
+
+def run(name, size, chunk_size, queue):
+    encode, decode = PATHS[name]
+    chunk = memoryview(bytearray(os.urandom(chunk_size)))
+    # what the node sends back on filesystem.read
+    body = json.dumps({'data': json.dumps(base64.b64encode(chunk).decode())}).encode()
+    count = max(size // chunk_size, 1)
+
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    wire = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        wire += len(encode(chunk))
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        decode(body)
+    decode_time = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    total = count * chunk_size
+    queue.put({
+        'path': name,
+        'bytes': total,
+        'wire_bytes': wire,
+        'encode_mbps': total / encode_time / (1024 * 1024),
+        'decode_mbps': total / decode_time / (1024 * 1024),
+        'peak_rss_kib': peak,
+        'rss_growth_kib': peak - base,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=256, help='total MiB to encode per path')
+    parser.add_argument('--chunk', type=int, default=512, help='chunk size in KiB')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    options = parser.parse_args()
+
+    results = []
+    for name in PATHS:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run, args=(name, options.size * 1024 * 1024,
+                                                             options.chunk * 1024, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<8} {:>12} {:>12} {:>12} {:>14}'.format('path', 'wire/data', 'encode MB/s', 'decode MB/s', 'peak RSS KiB'))
+    for result in results:
+        print('{:<8} {:>12.3f} {:>12.1f} {:>12.1f} {:>14}'.format(
+            result['path'], result['wire_bytes'] / result['bytes'], result['encode_mbps'],
+            result['decode_mbps'], result['peak_rss_kib'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
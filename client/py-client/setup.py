@@ -20,5 +20,10 @@ setup (
     license='Apache 2.0',
     namespaces=['zeroos'],
     packages=find_packages(),
-    install_requires=['redis>=2.10.5', 'pyaml'],
+    install_requires=['redis>=3.3', 'pyaml'],
+    extras_require={
+        'async': ['redis>=4.2'],
+        'metrics': ['numpy'],
+        'testing': ['fakeredis'],
+    },
 )
@@ -0,0 +1,113 @@
+"""
+The asyncio client reuses the sync managers, so every inherited method that talks to the node must either hand
+the awaitable back to the caller untouched, or be overridden with a coroutine.
+A sync method that post-processes the result of the node (or of another coroutine method) would silently
+return garbage on the asyncio client, this test fails as soon as such a method is added to a manager.
+"""
+import ast
+import inspect
+import os
+import sys
+import textwrap
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import asyncclient, client  # noqa: E402
+
+# calls of the node that return an awaitable on the asyncio client
+PASSTHROUGH = ('json', 'raw', 'sync', 'bash', 'system')
+
+
+def managers(cl):
+    """
+    All the managers reachable from a client object, as {name: manager}
+    """
+    found = {}
+    for name, value in inspect.getmembers(type(cl), lambda m: isinstance(m, property)):
+        manager = getattr(cl, name)
+        if type(manager).__module__ in (client.__name__, asyncclient.__name__) and hasattr(manager, '_client'):
+            found['{}.{}'.format(type(cl).__name__, name)] = manager
+    return found
+
+
+def inherited(cls):
+    """
+    Sync methods of cls that are inherited from the sync client
+    """
+    for name, fn in inspect.getmembers(cls, inspect.isfunction):
+        if name.startswith('__') or inspect.iscoroutinefunction(fn):
+            continue
+        owner = next(base for base in cls.__mro__ if name in vars(base))
+        if owner.__module__ != asyncclient.__name__:
+            yield name, fn
+
+
+def is_call(node, target, names=None):
+    """
+    node is a call of self.<name>(...) (target is None) or self.<target>.<name>(...)
+    """
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return False
+    value = node.func.value
+    if target is not None:
+        if not isinstance(value, ast.Attribute) or value.attr != target:
+            return False
+        value = value.value
+    if not isinstance(value, ast.Name) or value.id != 'self':
+        return False
+    return names is None or node.func.attr in names
+
+
+def violations(cls, fn):
+    """
+    Node calls of fn whose result is not directly returned
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(fn))).body[0]
+    returned = set(id(node.value) for node in ast.walk(tree) if isinstance(node, ast.Return))
+    coroutines = [name for name, method in inspect.getmembers(cls, inspect.iscoroutinefunction)]
+
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr == '_client' and \
+                isinstance(node.value, ast.Name) and node.value.id == 'self':
+            found.append(node)
+        elif is_call(node, None, coroutines) and id(node) not in returned:
+            found.append(node)
+
+    bad = []
+    for node in found:
+        if isinstance(node, ast.Attribute):
+            # self._client must only be used in `return self._client.<passthrough>(...)`
+            if any(is_call(call, '_client', PASSTHROUGH) and call.func.value is node and id(call) in returned
+                   for call in ast.walk(tree)):
+                continue
+        bad.append(node.lineno)
+    return bad
+
+
+class AsyncSurfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.client = asyncclient.AsyncClient('127.0.0.1')
+        except RuntimeError as e:
+            self.skipTest(str(e))
+
+    def test_inherited_methods(self):
+        found = managers(self.client)
+        found.update(managers(asyncclient.AsyncContainerClient(self.client, 1)))
+        self.assertGreater(len(found), 15)
+
+        broken = []
+        for where, manager in sorted(found.items()):
+            cls = type(manager)
+            for name, fn in inherited(cls):
+                if violations(cls, fn):
+                    broken.append('{} {}.{}'.format(where, cls.__name__, name))
+
+        self.assertEqual(broken, [], 'sync methods inherited by the asyncio client, override them with a coroutine')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Window queries of the metrics Series, across the raw samples and the downsampled points
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import collector  # noqa: E402
+
+
+class SeriesTest(unittest.TestCase):
+
+    def setUp(self):
+        # 10 raw samples, downsampled points of 5 samples: t=0..19 are only kept downsampled
+        self.series = collector.Series(10, 5, 10)
+        for t in range(30):
+            self.series.append(t, 100.0 if t in (8, 29) else 1.0)
+
+    def test_max_min(self):
+        for seconds in range(40):
+            self.assertEqual(self.series.max(seconds), 100.0, seconds)
+        for seconds in range(1, 40):
+            self.assertEqual(self.series.min(seconds), 1.0, seconds)
+        self.assertEqual(self.series.max(7, now=15), 100.0)
+        self.assertEqual(self.series.max(3, now=25), 1.0)
+
+    def test_mean(self):
+        self.assertAlmostEqual(self.series.mean(100), (28 + 200) / 30)
+        self.assertAlmostEqual(self.series.mean(4), (4 + 100) / 5)
+
+    def test_window(self):
+        times, values = self.series.window(100)
+        # downsampled points (mean of 5 samples) then the raw samples
+        self.assertEqual(list(times), [4, 9, 14, 19] + list(range(20, 30)))
+        self.assertEqual(list(values[:4]), [1.0, 20.8, 1.0, 1.0])
+        self.assertEqual(list(values[4:]), [1.0] * 9 + [100.0])
+
+    def test_without_numpy(self):
+        numpy = collector._numpy
+        collector._numpy = False
+        try:
+            self.assertEqual(self.series.max(100), 100.0)
+            self.assertAlmostEqual(self.series.mean(100), (28 + 200) / 30)
+            self.assertEqual(self.series.percentile(100, 50), 1.0)
+        finally:
+            collector._numpy = numpy
+
+
+if __name__ == '__main__':
+    unittest.main()
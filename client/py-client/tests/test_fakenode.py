@@ -0,0 +1,295 @@
+"""
+Smoke tests of the client against the in process fake node (zeroos.core0.client.fakenode), they run without
+Zero-OS (requires fakeredis).
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import (  # noqa: E402
+    LatencyRecorder, as_completed, merge_streams, wait_all, wait_any,
+)
+from zeroos.core0.client import fakenode  # noqa: E402
+
+LINES = 5
+
+
+@unittest.skipIf(fakenode.fakeredis is None, 'requires fakeredis')
+class FakeNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.node = fakenode.FakeNode(latencies={'info.mem': 0.3, 'bash': 0.3}, sizes={'lines': LINES})
+        self.node.start()
+        self.addCleanup(self.node.stop)
+        self.client = self.node.client()
+
+    def test_json(self):
+        self.assertEqual(self.client.ping(), 'PONG')
+        self.assertIsInstance(self.client.info.cpu(), list)
+        self.assertEqual(self.client.system('ls').get().state, 'SUCCESS')
+
+    def test_raw_batch(self):
+        responses = self.client.raw_batch(
+            [{'command': 'core.ping', 'arguments': {}} for _ in range(10)] +
+            [{'command': 'core.system', 'arguments': {'name': 'ls', 'args': [], 'dir': '', 'stdin': '', 'env': None}}]
+        )
+        results = wait_all(responses)
+        self.assertEqual(len(results), 11)
+        self.assertEqual([result.json() for result in results[:10]], ['PONG'] * 10)
+        self.assertEqual(results[10].state, 'SUCCESS')
+        self.assertEqual(len(results[10].stdout.splitlines()), LINES)
+
+    def test_as_completed(self):
+        slow = self.client.raw('info.mem', {})
+        fast = [self.client.raw('core.ping', {}) for _ in range(5)]
+        order = [response.id for response, _ in as_completed([slow] + fast)]
+        self.assertEqual(sorted(order), sorted(response.id for response in [slow] + fast))
+        self.assertEqual(order[-1], slow.id)
+
+        response, result = wait_any([self.client.raw('info.mem', {}), self.client.raw('core.ping', {})])
+        self.assertEqual(result.json(), 'PONG')
+        # the result is still readable after as_completed
+        self.assertEqual(response.get().json(), 'PONG')
+
+    def test_transfer(self):
+        data = os.urandom(3 * 256 * 1024 + 17)
+        for window in (1, 4):
+            stats = self.client.filesystem.upload('/file', io.BytesIO(data), window=window, chunk_size=256 * 1024)
+            self.assertEqual(stats['size'], len(data))
+            self.assertEqual(bytes(self.node.files['/file']), data)
+
+            output = io.BytesIO()
+            stats = self.client.filesystem.download('/file', output, window=window)
+            self.assertEqual(stats['size'], len(data))
+            self.assertEqual(output.getvalue(), data)
+
+    def test_merge_streams(self):
+        jobs = [self.client.system('build', stream=True) for _ in range(3)]
+        lines = {}
+        for id, level, line, flags in merge_streams(self.client, jobs, subscribe=False):
+            if level == 1:
+                lines.setdefault(id, []).append(line)
+
+        self.assertEqual(sorted(lines), sorted(job.id for job in jobs))
+        for id, output in lines.items():
+            self.assertEqual(output, ['build output line {}\n'.format(i) for i in range(LINES)])
+
+    def test_merge_streams_subscribe(self):
+        jobs = [self.client.bash('build') for _ in range(3)]
+        lines = {}
+        for id, level, line, flags in merge_streams(self.client, jobs):
+            if level == 1:
+                lines.setdefault(id, []).append(line)
+
+        self.assertEqual(sorted(lines), sorted(job.id for job in jobs))
+        for id, output in lines.items():
+            self.assertEqual(output, ['bash output line {}\n'.format(i) for i in range(LINES)])
+
+        # the job already exited, the subscription fails and its stream ends
+        self.assertEqual(list(merge_streams(self.client, jobs[:1])), [(jobs[0].id, 30, '', 0x4)])
+
+    def test_cache(self):
+        cl = self.node.client(cache=True)
+        self.assertEqual(cl.info.cpu(), cl.info.cpu())
+        self.assertEqual(cl.cache.stats()['hits'], 1)
+
+        self.assertEqual(cl.container.list(), {})
+        cl.container.create('flist').get()
+        # creating a container invalidates the cached list
+        self.assertEqual(len(cl.container.list()), 1)
+
+    def test_create_terminate_many(self):
+        specs = [{'root_url': 'flist', 'tags': ['smoke']} for _ in range(5)]
+        specs.insert(2, {'root_url': 5})
+        result = self.client.container.create_many(specs, concurrency=2)
+        self.assertEqual(sorted(result.results), [0, 1, 3, 4, 5])
+        self.assertEqual(list(result.errors), [2])
+        self.assertEqual(len(self.client.container.find('smoke')), 5)
+
+        result = self.client.container.terminate_many(tags=['smoke'], concurrency=2)
+        self.assertEqual(len(result.results), 5)
+        self.assertEqual(result.errors, {})
+        self.assertEqual(self.client.container.list(), {})
+
+    def test_latency(self):
+        cl = self.node.client(latency=LatencyRecorder())
+        cl.system('ls').get()
+        histogram = cl.latency.histogram('core.system', 'total')
+        self.assertEqual(histogram.count, 1)
+        self.assertIn('command="core.system"', cl.latency.openmetrics())
+
+
+@unittest.skipIf(fakenode.fakeredis is None, 'requires fakeredis')
+class StalledNodeTest(unittest.TestCase):
+    """
+    The node is never started, so no job gets queued
+    """
+
+    def setUp(self):
+        self.client = fakenode.FakeNode().client()
+
+    def test_raw_batch_deadline(self):
+        start = time.time()
+        with self.assertRaises(TimeoutError):
+            self.client.raw_batch([{'command': 'core.ping', 'arguments': {}}] * 3, timeout=1)
+        self.assertLess(time.time() - start, 2)
+
+    def test_create_many_deadline(self):
+        start = time.time()
+        result = self.client.container.create_many([{'root_url': 'flist'}] * 5, concurrency=2, timeout=2)
+        self.assertLess(time.time() - start, 3)
+        self.assertEqual(result.results, {})
+        self.assertEqual(sorted(result.errors), [0, 1, 2, 3, 4])
+        for error in result.errors.values():
+            self.assertIsInstance(error, TimeoutError)
+
+
+@unittest.skipIf(fakenode.fakeredis is None, 'requires fakeredis')
+class FakeNodeShellTest(unittest.TestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.node = fakenode.FakeNode(root=root.name)
+        self.node.start()
+        self.addCleanup(self.node.stop)
+        self.client = self.node.client()
+
+    def test_result_keeps_last_lines(self):
+        result = self.client.bash('seq 1 250').get()
+        self.assertEqual(result.stdout.split(), [str(i) for i in range(151, 251)])
+
+    def test_sync_file(self):
+        block_size = 4096
+        # more blocks than the lines kept in a job result
+        data = bytearray(os.urandom(150 * block_size))
+        local = tempfile.NamedTemporaryFile()
+        self.addCleanup(local.close)
+
+        def sync():
+            local.seek(0)
+            local.truncate()
+            local.write(data)
+            local.flush()
+            stats = self.client.filesystem.sync_file('disk.img', local.name, block_size=block_size, batch=16)
+            self.assertEqual(bytes(self.node.files['disk.img']), bytes(data))
+            return stats
+
+        stats = sync()
+        self.assertEqual((stats['blocks'], stats['changed']), (150, 150))
+
+        data[3 * block_size] ^= 0xff
+        data[120 * block_size + 10] ^= 0xff
+        data.extend(b'tail')
+        stats = sync()
+        self.assertEqual((stats['blocks'], stats['changed'], stats['transferred']), (151, 3, 2 * block_size + 4))
+
+        self.assertEqual(sync()['changed'], 0)
+
+        del data[100 * block_size:]
+        stats = sync()
+        self.assertEqual((stats['blocks'], stats['changed']), (100, 0))
+        self.assertNotIn('disk.img.sync-patch', self.node.files)
+
+
+@unittest.skipIf(fakenode.fakeredis is None, 'requires fakeredis')
+class AsyncFakeNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.node = fakenode.FakeNode(root=root.name)
+        self.node.start()
+        self.addCleanup(self.node.stop)
+        try:
+            self.client = self.node.async_client()
+        except RuntimeError as e:
+            self.skipTest(str(e))
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_smoke(self):
+        cl = self.client
+        data = os.urandom(3 * 256 * 1024 + 17)
+
+        async def run():
+            self.assertEqual(await cl.ping(), 'PONG')
+            self.assertEqual((await (await cl.system('ls')).get()).state, 'SUCCESS')
+            for window in (1, 4):
+                await cl.filesystem.upload('/file', io.BytesIO(data), window=window, chunk_size=256 * 1024)
+                output = io.BytesIO()
+                stats = await cl.filesystem.download('/file', output, window=window)
+                self.assertEqual(stats['size'], len(data))
+                self.assertEqual(output.getvalue(), data)
+
+            await (await cl.container.create('flist')).get()
+            self.assertEqual(len(await cl.container.list()), 1)
+            await cl.close()
+
+        self.run_async(run())
+
+    def test_create_terminate_many(self):
+        cl = self.client
+
+        async def run():
+            specs = [{'root_url': 'flist', 'tags': ['smoke']} for _ in range(5)]
+            specs.insert(2, {'root_url': 5})
+            result = await cl.container.create_many(specs, concurrency=2)
+            self.assertEqual(sorted(result.results), [0, 1, 3, 4, 5])
+            self.assertEqual(list(result.errors), [2])
+            self.assertEqual(len(await cl.container.find('smoke')), 5)
+
+            result = await cl.container.terminate_many([1, 'x'], tags=['smoke'], concurrency=2)
+            self.assertEqual(sorted(result.results), [1, 2, 3, 4, 5])
+            self.assertEqual(list(result.errors), ['x'])
+            self.assertEqual(await cl.container.list(), {})
+
+            self.node._latencies['corex.create'] = 2
+            start = time.time()
+            result = await cl.container.create_many([{'root_url': 'flist'}] * 3, concurrency=2, timeout=0.5)
+            self.assertLess(time.time() - start, 1.5)
+            self.assertEqual(sorted(result.errors), [0, 1, 2])
+            for error in result.errors.values():
+                self.assertIsInstance(error, TimeoutError)
+            await cl.close()
+
+        self.run_async(run())
+
+    def test_sync_file(self):
+        cl = self.client
+        block_size = 4096
+        data = bytearray(os.urandom(150 * block_size))
+        local = tempfile.NamedTemporaryFile()
+        self.addCleanup(local.close)
+
+        async def sync():
+            local.seek(0)
+            local.write(data)
+            local.flush()
+            stats = await cl.filesystem.sync_file('disk.img', local.name, block_size=block_size)
+            self.assertEqual(bytes(self.node.files['disk.img']), bytes(data))
+            return stats
+
+        async def run():
+            self.assertEqual((await sync())['changed'], 150)
+            data[7 * block_size] ^= 0xff
+            data[140 * block_size] ^= 0xff
+            self.assertEqual((await sync())['changed'], 2)
+            await cl.close()
+
+        self.run_async(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+The compiled validators (typchk._compile) must accept exactly the objects accepted by the tracking checker
+(Checker._check, that reports the path and reason of a failure). Random objects are generated from all the
+manager schemas, mostly valid with random defects, and both checkers must agree on every one of them.
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeroos.core0.client import client, typchk  # noqa: E402
+
+SAMPLES = 300
+
+JUNK = [None, 0, 1, -1, True, False, 1.5, '', 'x', b'x', [], ['x'], (), ('x',), {}, {'x': 1}]
+
+
+def schemas():
+    """
+    All the Checker attributes of the client classes
+    """
+    found = {}
+    for name in dir(client):
+        cls = getattr(client, name)
+        if not isinstance(cls, type):
+            continue
+        for attr, value in vars(cls).items():
+            if isinstance(value, typchk.Checker):
+                found.setdefault(id(value), ('{}.{}'.format(name, attr), value))
+    return sorted(found.values(), key=lambda item: item[0])
+
+
+def primitive(typ, rnd):
+    if typ is str:
+        return rnd.choice(['', 'name', 'x' * 20])
+    if typ is int:
+        return rnd.randint(-5, 1 << 40)
+    if typ is float:
+        return rnd.random()
+    if typ is bool:
+        return rnd.random() < 0.5
+    return rnd.choice(JUNK)
+
+
+def generate(typ, rnd, depth=0):
+    """
+    Random object of the type-def, with random defects
+    """
+    if rnd.random() < 0.05 or depth > 6:
+        return rnd.choice(JUNK + [typchk.missing])
+
+    cls = type(typ)
+    if cls is typchk.Any:
+        return rnd.choice(JUNK)
+    if cls is typchk.IsNone:
+        return None
+    if cls is typchk.Missing:
+        return typchk.missing
+    if cls is typchk.Enum:
+        return rnd.choice(list(typ._valid) + ['invalid'])
+    if cls is typchk.Or:
+        return generate(rnd.choice(typ._checkers)._typ, rnd, depth + 1)
+    if cls is typchk.Length:
+        value = generate(typ._checker._typ, rnd, depth + 1)
+        if isinstance(value, (list, str)) and rnd.random() < 0.5:
+            value = value * rnd.randint(0, 3)
+        return value
+    if cls is typchk.Map:
+        value = {}
+        for _ in range(rnd.randint(0, 3)):
+            key = generate(typ._key._typ, rnd, depth + 1)
+            if isinstance(key, (list, dict)):
+                key = tuple(key)
+            value[key] = generate(typ._value._typ, rnd, depth + 1)
+        return value
+    if cls is list or cls is tuple:
+        value = [generate(typ[0], rnd, depth + 1) for _ in range(rnd.randint(0, 3))]
+        if rnd.random() < 0.05:
+            return tuple(value) if cls is list else value
+        return cls(value)
+    if cls is dict:
+        value = {}
+        for key, attr in typ.items():
+            v = generate(attr, rnd, depth + 1)
+            if v is not typchk.missing and rnd.random() > 0.05:
+                value[key] = v
+        if rnd.random() < 0.05:
+            value['unknown'] = 1
+        return value
+    return primitive(typ, rnd)
+
+
+def tracked(checker, obj):
+    try:
+        checker._check(checker._typ, obj, typchk.Tracker([]).push('/'))
+    except typchk.Tracker:
+        return False
+    return True
+
+
+class CompiledCheckerTest(unittest.TestCase):
+
+    def test_manager_schemas(self):
+        found = schemas()
+        self.assertGreater(len(found), 40)
+        rnd = random.Random(1)
+        for name, checker in found:
+            accepted = 0
+            for _ in range(SAMPLES):
+                obj = generate(checker._typ, rnd)
+                valid = checker.valid(obj)
+                self.assertEqual(valid, tracked(checker, obj), '{}: {!r}'.format(name, obj))
+                accepted += valid
+            # make sure both outcomes were exercised
+            self.assertLess(accepted, SAMPLES, name)
+
+    def test_check_reports_failure(self):
+        checker = typchk.Checker({'name': str, 'tags': typchk.Or([str], typchk.IsNone())})
+        checker.check({'name': 'a', 'tags': None})
+        with self.assertRaises(typchk.Tracker) as ctx:
+            checker.check({'name': 'a', 'tags': ['a', 1]})
+        self.assertIn('tags', str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
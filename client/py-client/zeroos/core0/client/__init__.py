@@ -1 +1,9 @@
-from .client import Client, ResultError, JobNotFoundError
+from .client import (
+    Client, ResultError, JobNotFoundError, SubmitError, as_completed, wait_all, wait_any, merge_streams,
+)
+from .asyncclient import AsyncClient
+from .cache import ResultCache
+from .latency import LatencyRecorder, Histogram
+from .inventory import Inventory, InventoryDiff
+from .group import ClientGroup, GroupResult, GroupError
+from .collector import MetricsCollector, Series
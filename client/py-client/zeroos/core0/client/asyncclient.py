@@ -0,0 +1,1163 @@
+import asyncio
+import base64
+import collections
+import shlex
+import socket
+import time
+import sys
+import io
+import logging
+import yaml
+
+from .client import (
+    DefaultTimeout, Block, dumps, logger, JobNotFoundError, ResultError, SubmitError, Response, _stream_message,
+    BaseClient, Client, ContainerClient, FilesystemManager, ContainerManager, BridgeManager,
+    DiskManager, BtrfsManager, ZerotierManager, KvmManager, Logger, Nft, Config,
+    AggregatorManager, RTInfoManager, CGroupManager, ZFSManager, SocatManager, PowerManager,
+)
+from .group import GroupResult
+from .inventory import Inventory, container_fingerprint
+
+_aioredis = None
+
+
+def _get_aioredis():
+    """
+    redis.asyncio (or False if it's not available), imported on first use so importing the client doesn't pay for it
+    """
+    global _aioredis
+    if _aioredis is None:
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            aioredis = False
+        _aioredis = aioredis
+    return _aioredis
+
+
+class AsyncResponse:
+    """
+    Asyncio version of the Response object. All methods that talk to the node are coroutines.
+    """
+    __slots__ = ('_client', '_id', '_queue', '_dispatch', '_timing')
+
+    _result = Response._result
+
+    def __init__(self, client, id, dispatch=None, timing=None):
+        """
+        :param dispatch: AsyncResponse of the corex.dispatch job that queued this job in a container (check Response)
+        :param timing: job submission times (check Response)
+        """
+        self._client = client
+        self._id = id
+        self._queue = 'result:{}'.format(id)
+        self._dispatch = dispatch
+        self._timing = timing
+
+    @property
+    def id(self):
+        """
+        Job ID
+        :return: string
+        """
+        return self._id
+
+    @property
+    def exists(self):
+        """
+        Returns an awaitable that resolves to true if the job is still running or zero-os still knows
+        about this job ID (check Response.exists)
+        """
+        return self._exists()
+
+    @property
+    def running(self):
+        """
+        Returns an awaitable that resolves to true if job still in running state
+        """
+        return self._running()
+
+    async def _resolve(self):
+        dispatch = self._dispatch
+        if dispatch is None:
+            return
+
+        result = await dispatch.get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to dispatch command to container: %s' % result.data)
+        self._dispatch = None
+
+    async def _exists(self):
+        await self._resolve()
+        r = self._client._redis
+        flag = '{}:flag'.format(self._queue)
+        return bool(await r.exists(flag))
+
+    async def _running(self):
+        await self._resolve()
+        r = self._client._redis
+        flag = '{}:flag'.format(self._queue)
+        if bool(await r.exists(flag)):
+            return await r.ttl(flag) < 0
+
+        return False
+
+    async def stream(self, callback=None, batch=1000):
+        """
+        Runtime copy of job messages, check Response.stream for the callback arguments.
+
+        :param callback: callback method that will get called for each received message, if the callback
+                         returns an awaitable, it will be awaited before reading the next message
+        :param batch: max number of queued messages to fetch in one round trip
+        :return: number of received messages
+        """
+        if callback is None:
+            callback = AsyncResponse.__default
+
+        if not callable(callback):
+            raise Exception('callback must be callable')
+
+        count = 0
+        async for level, line, flags in self.iter_stream(batch=batch):
+            ret = callback(level, line, flags)
+            if hasattr(ret, '__await__'):
+                await ret
+            count += 1
+        return count
+
+    def iter_stream(self, batch=1000, timeout=10):
+        """
+        Asynchronous iterator over the job messages, check Response.iter_stream
+
+        example:
+            async for level, line, flags in job.iter_stream():
+                print(line, end='')
+
+        :param batch: max number of queued messages to fetch in one round trip
+        :param timeout: max time in seconds to block waiting for a message before checking if the job is still running
+        :return: async iterator of (level, message, flags) tuples
+        """
+        return AsyncStream(self, batch, timeout)
+
+    @staticmethod
+    def __default(level, line, meta):
+        w = sys.stdout if level == 1 else sys.stderr
+        w.write(line)
+
+    async def get(self, timeout=None):
+        """
+        Waits for a job to finish (max of given timeout seconds) and return job results. Check Response.get
+
+        :param timeout: max time to wait for the job to finish in seconds
+        :return: Return object
+        """
+        if timeout is None:
+            timeout = self._client.timeout
+        r = self._client._redis
+        start = time.time()
+        maxwait = timeout
+        while maxwait > 0:
+            if not await self.exists:
+                raise JobNotFoundError(self.id)
+            v = await r.brpoplpush(self._queue, self._queue, min(maxwait, 10))
+            if v is not None:
+                return self._result(v)
+            logger.debug('%s still waiting (%ss)', self._id, int(time.time() - start))
+            maxwait -= 10
+        raise TimeoutError()
+
+
+class AsyncStream:
+    """
+    Asynchronous iterator over the messages of a job stream (check AsyncResponse.iter_stream)
+    """
+
+    def __init__(self, response, batch, timeout):
+        self._response = response
+        self._queue = 'stream:%s' % response.id
+        self._batch = batch
+        self._timeout = timeout
+        self._pending = collections.deque()
+        self._drain = False
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._pending:
+            if self._done:
+                raise StopAsyncIteration()
+            await self._fetch()
+
+        level, line, flags = _stream_message(self._response._client._codec.loads, self._pending.popleft())
+        if flags & 0x6 != 0:
+            self._done = True
+            self._pending.clear()
+        return level, line, flags
+
+    async def _fetch(self):
+        await self._response._resolve()
+        r = self._response._client._redis
+        if self._drain:
+            # drain what got queued meanwhile, the transaction makes sure no message is trimmed without being read
+            pipe = r.pipeline()
+            pipe.lrange(self._queue, 0, self._batch - 1)
+            pipe.ltrim(self._queue, self._batch, -1)
+            bodies, _ = await pipe.execute()
+            self._pending.extend(bodies)
+            self._drain = len(bodies) > 0
+            return
+
+        data = await r.blpop(self._queue, min(self._timeout, DefaultTimeout))
+        if data is None:
+            self._done = not await self._response.running
+            return
+
+        self._pending.append(data[1])
+        self._drain = True
+
+
+class AsyncJSONResponse(AsyncResponse):
+    __slots__ = ()
+
+    def __init__(self, response):
+        super().__init__(response._client, response.id, response._dispatch, response._timing)
+
+    async def get(self, timeout=None):
+        """
+        Get response as json, will fail if the job doesn't return a valid json response
+
+        :param timeout: client side timeout in seconds
+        """
+        result = await super().get(timeout)
+        if result.state != 'SUCCESS':
+            raise ResultError(result.data, result.code)
+        if result.level != 20:
+            raise ResultError('not a json response: %d' % result.level, 406)
+
+        return result.json()
+
+
+class AsyncInventory(Inventory):
+    """
+    Asyncio version of the Inventory (check Inventory)
+
+    example:
+        inventory = cl.container.inventory()
+        async for diff in inventory.follow(5):
+            print(diff)
+    """
+
+    async def poll(self):
+        """
+        Fetch the list from the node and update the mirror (check Inventory.poll)
+
+        :return: InventoryDiff
+        """
+        return self._update(await self._client.sync(self._command, {}))
+
+    def follow(self, interval=5):
+        """
+        Poll the node every interval seconds (check Inventory.follow)
+
+        :return: asynchronous iterator of InventoryDiff
+        """
+        return AsyncInventoryFollow(self, interval)
+
+
+class AsyncInventoryFollow:
+    """
+    Asynchronous iterator over the non empty diffs of an inventory (check AsyncInventory.follow)
+    """
+
+    def __init__(self, inventory, interval):
+        self._inventory = inventory
+        self._interval = interval
+        self._last = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if self._last is not None:
+                await asyncio.sleep(max(0, self._interval - (time.monotonic() - self._last)))
+            self._last = time.monotonic()
+            diff = await self._inventory.poll()
+            if diff:
+                return diff
+
+
+class AsyncFilesystemManager(FilesystemManager):
+
+    async def read(self, fd):
+        """
+        Read a block from the given file descriptor
+
+        :param fd: file descriptor
+        :return: bytes
+        """
+        args = {
+            'fd': fd,
+        }
+
+        data = await self._client.json('filesystem.read', args)
+        return base64.b64decode(data)
+
+    async def upload(self, remote, reader, window=1, chunk_size=512 * 1024):
+        """
+        Uploads a file, check FilesystemManager.upload
+        :param remote: remote file name
+        :param reader: an object that implements the read(size) method (typically a file descriptor)
+        :param window: max number of write jobs in flight
+        :param chunk_size: size of each written block in bytes
+        :return: dict with transfer stats {'size': <bytes>, 'elapsed': <seconds>, 'throughput': <bytes/second>}
+        """
+        start = time.time()
+        size = 0
+        fd = await self.open(remote, 'w')
+        try:
+            queue = self._queue(fd, window)
+            inflight = collections.deque()
+            # the block is serialized once the write job is queued, so the buffer can be reused
+            buffer = memoryview(bytearray(chunk_size)) if hasattr(reader, 'readinto') else None
+            while True:
+                if buffer is not None:
+                    n = reader.readinto(buffer)
+                    chunk = buffer[:n]
+                else:
+                    chunk = reader.read(chunk_size)
+                    n = len(chunk)
+                if n == 0:
+                    break
+                if len(inflight) >= window:
+                    await inflight.popleft().get()
+                inflight.append(await self._write(fd, chunk, queue))
+                size += n
+
+            while inflight:
+                await inflight.popleft().get()
+        finally:
+            await self.close(fd)
+
+        return self._stats(remote, size, start)
+
+    async def download(self, remote, writer, window=1):
+        """
+        Downloads a file, check FilesystemManager.download
+        :param remote: remote file name
+        :param writer: an object the implements the write(bytes) interface (typical a file descriptor)
+        :param window: max number of read jobs in flight
+        :return: dict with transfer stats {'size': <bytes>, 'elapsed': <seconds>, 'throughput': <bytes/second>}
+        """
+        start = time.time()
+        size = 0
+        fd = await self.open(remote)
+        try:
+            queue = self._queue(fd, window)
+            inflight = collections.deque()
+            while True:
+                while len(inflight) < window:
+                    inflight.append(await self._read(fd, queue))
+
+                chunk = base64.b64decode(await inflight.popleft().get())
+                if chunk == b'':
+                    break
+                writer.write(chunk)
+                size += len(chunk)
+
+            # read jobs in flight after the end of file return empty blocks
+            while inflight:
+                await inflight.popleft().get()
+        finally:
+            await self.close(fd)
+
+        return self._stats(remote, size, start)
+
+    async def _write(self, fd, bytes, queue):
+        args = {
+            'fd': fd,
+            'block': Block(bytes),
+        }
+
+        return AsyncJSONResponse(await self._client.raw('filesystem.write', args, queue=queue))
+
+    async def _read(self, fd, queue):
+        args = {
+            'fd': fd,
+        }
+
+        return AsyncJSONResponse(await self._client.raw('filesystem.read', args, queue=queue))
+
+    async def upload_file(self, remote, local, window=1):
+        """
+        Uploads a file
+        :param remote: remote file name
+        :param local: local file name
+        :param window: max number of write jobs in flight (check upload)
+        :return: transfer stats (check upload)
+        """
+        file = open(local, 'rb')
+        try:
+            return await self.upload(remote, file, window=window)
+        finally:
+            file.close()
+
+    async def download_file(self, remote, local, window=1):
+        """
+        Downloads a file
+        :param remote: remote file name
+        :param local: local file name
+        :param window: max number of read jobs in flight (check download)
+        :return: transfer stats (check download)
+        """
+        file = open(local, 'wb')
+        try:
+            return await self.download(remote, file, window=window)
+        finally:
+            file.close()
+
+    async def sync_file(self, remote, local, block_size=1024 * 1024, batch=16, window=4):
+        """
+        Synchronize a local file to the node, transferring only the blocks that differ.
+        Check FilesystemManager.sync_file
+
+        :return: dict with sync stats (check FilesystemManager.sync_file)
+        """
+        start = time.time()
+        size, hashes = self._local_hashes(local, block_size)
+        remote_size, remote_hashes = await self._remote_hashes(remote, block_size)
+        changed = [i for i, h in enumerate(hashes) if remote_hashes.get(i) != h]
+        if remote_size != size:
+            # resize first, so the last (partial) block can be verified once patched
+            await self._bash('truncate -s {} {}'.format(size, shlex.quote(remote)), 'failed to truncate remote file')
+
+        patch = '{}.sync-patch'.format(remote)
+        transferred = 0
+
+        with open(local, 'rb') as file:
+            for offset in range(0, len(changed), batch):
+                blocks = changed[offset:offset + batch]
+                buf = self._read_blocks(file, blocks, block_size)
+                transferred += len(buf.getbuffer())
+                await self.upload(patch, buf, window=window)
+                await self._bash(self._patch_script(patch, remote, block_size, blocks), 'failed to patch remote file')
+
+                _, verified = await self._remote_hashes(remote, block_size, blocks)
+                self._verify(remote, blocks, hashes, verified)
+
+        return self._sync_stats(remote, size, hashes, changed, transferred, start)
+
+    async def _remote_hashes(self, remote, block_size, blocks=None):
+        # the job result only keeps the last lines of stdout, so the hashes are read from the job stream
+        response = await self._client.bash(self._hash_script(remote, block_size, blocks), stream=True)
+        lines = []
+        async for level, line, _ in response.iter_stream():
+            if level == 1:
+                lines.extend(line.split())
+        result = await response.get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to hash remote file: %s' % result.stderr)
+
+        return self._parse_hashes(lines)
+
+    async def _bash(self, script, error):
+        result = await (await self._client.bash(script)).get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('%s: %s' % (error, result.stderr))
+        return result
+
+
+class AsyncBaseClient(BaseClient):
+    """
+    Asyncio version of the BaseClient. The managers are the same as the sync client, only every
+    call returns an awaitable.
+    """
+
+    @property
+    def filesystem(self):
+        """
+        filesystem manager
+        :return:
+        """
+        return self._manager('_filesystem', AsyncFilesystemManager)
+
+    async def raw(self, command, arguments, queue=None, max_time=None, stream=False,
+                  tags=None, id=None, recurring_period=None):
+        """
+        Check BaseClient.raw
+        :return: AsyncResponse object
+        """
+        raise NotImplementedError()
+
+    async def sync(self, command, arguments, tags=None, id=None):
+        """
+        Same as self.raw except it waits for the command execution to finish and reads the result
+        :return: Result object
+        """
+        response = await self.raw(command, arguments, tags=tags, id=id)
+
+        result = await response.get()
+        if result.state != 'SUCCESS':
+            raise ResultError(msg='%s' % result.data, code=result.code)
+
+        return result
+
+    async def json(self, command, arguments, tags=None, id=None):
+        """
+        Same as self.sync except it assumes the returned result is json, and loads the payload of the return object
+        if the returned (data) is not of level (20) an error is raised.
+        :Return: Data
+        """
+        key = self._cache_key(command, arguments, tags, id)
+        if key is not None:
+            data = self._cache.get(command, key)
+            if data is not None:
+                return self._codec.loads(data)
+
+        result = await self.sync(command, arguments, tags=tags, id=id)
+        if result.level != 20:
+            raise RuntimeError('invalid result level, expecting json(20) got (%d)' % result.level)
+
+        if key is not None:
+            self._cache.put(command, key, result.data)
+
+        return result.json()
+
+
+class AsyncContainerClient(AsyncBaseClient):
+    _raw_chk = ContainerClient._raw_chk
+
+    def __init__(self, client, container):
+        super().__init__(client.timeout, codec=client.codec)
+
+        self._client = client
+        self._container = container
+        self._zerotier = ContainerClient.ContainerZerotierManager(client, container)  # not (self) we use core0 client
+
+    @property
+    def container(self):
+        """
+        :return: container id
+        """
+        return self._container
+
+    @property
+    def zerotier(self):
+        """
+        information about zerotier id
+        :return:
+        """
+        return self._zerotier
+
+    async def raw(self, command, arguments, queue=None, max_time=None, stream=False, tags=None, id=None,
+                  recurring_period=None):
+        """
+        Check ContainerClient.raw
+        :return: AsyncResponse object
+        """
+        args = self._dispatch_args(command, arguments, queue=queue, max_time=max_time, stream=stream,
+                                   tags=tags, id=id, recurring_period=recurring_period)
+
+        response = await self._client.raw('corex.dispatch', args)
+        return AsyncResponse(self._client, args['command']['id'], dispatch=response)
+
+    _dispatch_args = ContainerClient._dispatch_args
+
+
+class AsyncContainerManager(ContainerManager):
+    DefaultNetworking = ContainerManager.DefaultNetworking
+
+    async def create(self, root_url, mount=None, host_network=False, nics=DefaultNetworking, port=None,
+                     hostname=None, privileged=False, storage=None, name=None, tags=None, identity=None, env=None,
+                     cgroups=None):
+        """
+        Creater a new container, check ContainerManager.create
+
+        :return: AsyncJSONResponse
+        """
+        args = self._create_args(
+            root_url, mount=mount, host_network=host_network, nics=nics, port=port, hostname=hostname,
+            privileged=privileged, storage=storage, name=name, identity=identity, env=env, cgroups=cgroups,
+        )
+
+        response = await self._client.raw('corex.create', args, tags=tags)
+
+        return AsyncJSONResponse(response)
+
+    async def terminate(self, container):
+        """
+        Terminate a container given it's id
+
+        :param container: container id
+        :return:
+        """
+        self._client_chk.check(container)
+        args = {
+            'container': int(container),
+        }
+        response = await self._client.raw('corex.terminate', args)
+
+        result = await response.get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to terminate container: %s' % result.data)
+
+    def client(self, container):
+        """
+        Return an async client instance that is bound to that container.
+
+        :param container: container id
+        :return: AsyncContainerClient object bound to the specified container id
+        """
+
+        self._client_chk.check(container)
+        return AsyncContainerClient(self._client, int(container))
+
+    async def create_many(self, specs, concurrency=50, timeout=None):
+        """
+        Create many containers concurrently, check ContainerManager.create_many
+
+        :return: GroupResult of {spec index: container id}
+        """
+        result = GroupResult()
+        jobs = self._create_jobs(specs, result)
+        await self._run_many(jobs, self._created, result, concurrency, timeout)
+        return result
+
+    async def terminate_many(self, containers=None, tags=None, concurrency=20, timeout=None):
+        """
+        Terminate many containers concurrently, check ContainerManager.terminate_many
+
+        :return: GroupResult of {container id: True}
+        """
+        result = GroupResult()
+        found = (await self.find(*tags) or {}) if tags else {}
+        jobs = self._terminate_jobs(containers, found, result)
+        await self._run_many(jobs, self._terminated, result, concurrency, timeout)
+        return result
+
+    async def _run_many(self, jobs, complete, result, concurrency, timeout):
+        """
+        Run jobs with at most `concurrency` of them in flight, the whole batch is bounded by timeout
+        (check ContainerManager._run_many)
+
+        :param jobs: list of (key, raw command dict)
+        :param complete: callable that gets the job Return object and returns the result of the job (or raises)
+        :param result: GroupResult where the outcome of each job is stored under its key
+        :param concurrency: max number of jobs in flight
+        :param timeout: max time in seconds for all the jobs
+        """
+        start = time.time()
+        concurrency = max(1, concurrency)
+        if timeout is None:
+            timeout = self._client.timeout * max(1, -(-len(jobs) // concurrency))
+        deadline = start + timeout
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(payload):
+            async with semaphore:
+                try:
+                    response = await self._client.raw(**payload)
+                except Exception as e:
+                    # the job might have been queued before the failure
+                    try:
+                        return await AsyncResponse(self._client, payload['id']).get(timeout)
+                    except JobNotFoundError:
+                        raise SubmitError(payload['id'], e)
+                return await response.get(timeout)
+
+        async def job(key, command):
+            try:
+                payload = self._client._payload(**command)
+                ret = await asyncio.wait_for(run(payload), deadline - time.time())
+                result.results[key] = complete(ret)
+            except asyncio.TimeoutError:
+                result.errors[key] = TimeoutError('timed out after {}s'.format(timeout))
+            except Exception as e:
+                result.errors[key] = e
+
+        await asyncio.gather(*[job(key, command) for key, command in jobs])
+        result._elapsed = time.time() - start
+
+    def inventory(self):
+        """
+        Local mirror of the containers (check ContainerManager.inventory)
+
+        :return: AsyncInventory of {container_id: <container info object>}
+        """
+        return AsyncInventory(self._client, 'corex.list', fingerprint=container_fingerprint)
+
+    async def backup(self, container, url):
+        """
+        Backup a container to the given restic url, check ContainerManager.backup
+
+        :return: AsyncJSONResponse to the backup job
+        """
+
+        args = {
+            'container': container,
+            'url': url,
+        }
+
+        return AsyncJSONResponse(await self._client.raw('corex.backup', args))
+
+    async def restore(self, url, tags=None):
+        """
+        Full restore of a container backup, check ContainerManager.restore
+
+        :return: AsyncJSONResponse to the restore job
+        """
+        args = {
+            'url': url,
+        }
+
+        return AsyncJSONResponse(await self._client.raw('corex.restore', args, tags=tags))
+
+
+class AsyncDiskManager(DiskManager):
+
+    async def _run(self, command, args, error):
+        response = await self._client.raw(command, args)
+
+        result = await response.get()
+
+        if result.state != 'SUCCESS':
+            raise RuntimeError('%s: %s' % (error, result.stderr))
+
+        return result
+
+    async def _json(self, command, args, error):
+        result = await self._run(command, args, error)
+
+        if result.level != 20:  # 20 is JSON output.
+            raise RuntimeError('invalid response type from %s command' % command)
+
+        # json decoders skip the surrounding white spaces (check DiskManager.list)
+        data = result.data
+        if data and not data.isspace():
+            return result.json()
+        else:
+            return {}
+
+    async def list(self):
+        """
+        List available block devices
+        """
+        return await self._json('disk.list', {}, 'failed to list disks')
+
+    async def mktable(self, disk, table_type='gpt'):
+        """
+        Make partition table on block device, check DiskManager.mktable
+        """
+        args = {
+            'disk': disk,
+            'table_type': table_type,
+        }
+
+        self._mktable_chk.check(args)
+
+        await self._run('disk.mktable', args, 'failed to create table')
+
+    async def getinfo(self, disk, part=''):
+        """
+        Get more info about a disk or a disk partition, check DiskManager.getinfo
+        """
+        args = {
+            "disk": disk,
+            "part": part,
+        }
+
+        self._getpart_chk.check(args)
+
+        return await self._json('disk.getinfo', args, 'failed to get info')
+
+    async def mkpart(self, disk, start, end, part_type='primary'):
+        """
+        Make partition on disk, check DiskManager.mkpart
+        """
+        args = {
+            'disk': disk,
+            'start': start,
+            'end': end,
+            'part_type': part_type,
+        }
+
+        self._mkpart_chk.check(args)
+
+        await self._run('disk.mkpart', args, 'failed to create partition')
+
+    async def rmpart(self, disk, number):
+        """
+        Remove partion from disk, check DiskManager.rmpart
+        """
+        args = {
+            'disk': disk,
+            'number': number,
+        }
+
+        self._rmpart_chk.check(args)
+
+        await self._run('disk.rmpart', args, 'failed to remove partition')
+
+    async def mount(self, source, target, options=[]):
+        """
+        Mount partion on target, check DiskManager.mount
+        """
+
+        if len(options) == 0:
+            options = ['']
+
+        args = {
+            'options': ','.join(options),
+            'source': source,
+            'target': target,
+        }
+
+        self._mount_chk.check(args)
+
+        await self._run('disk.mount', args, 'failed to mount partition')
+
+    async def umount(self, source):
+        """
+        Unmount partion, check DiskManager.umount
+        """
+
+        args = {
+            'source': source,
+        }
+        self._umount_chk.check(args)
+
+        await self._run('disk.umount', args, 'failed to umount partition')
+
+    async def spindown(self, disk, spindown=1):
+        """
+        Spindown a disk, check DiskManager.spindown
+        """
+        args = {
+            "disk": disk,
+            "spindown": spindown
+        }
+        self._spindown_chk.check(args)
+
+        await self._run('disk.spindown', args, 'failed to spindown disk {} to {}'.format(disk, spindown))
+
+
+class AsyncKvmManager(KvmManager):
+
+    def inventory(self):
+        """
+        Local mirror of the configured domains (check KvmManager.inventory)
+
+        :return: AsyncInventory of {uuid: <domain info object>}
+        """
+        return AsyncInventory(self._client, 'kvm.list', key='uuid')
+
+
+class AsyncZerotierManager(ZerotierManager):
+
+    async def join(self, network):
+        """
+        Join a zerotier network
+
+        :param network: network id to join
+        :return:
+        """
+        args = {'network': network}
+        self._network_chk.check(args)
+        response = await self._client.raw('zerotier.join', args)
+        result = await response.get()
+
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to join zerotier network: %s' % result.stderr)
+
+    async def leave(self, network):
+        """
+        Leave a zerotier network
+
+        :param network: network id to leave
+        :return:
+        """
+        args = {'network': network}
+        self._network_chk.check(args)
+        response = await self._client.raw('zerotier.leave', args)
+        result = await response.get()
+
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to leave zerotier network: %s' % result.stderr)
+
+
+class AsyncZFSManager(ZFSManager):
+
+    @property
+    def config(self):
+        """
+        Awaitable that resolves to the local routing table, check ZFSManager.config.
+        To set the table use `await zfs.set_config(table)`
+        """
+        return self._get_config()
+
+    @config.setter
+    def config(self, table):
+        raise RuntimeError('can not set config from the async client, use set_config instead')
+
+    async def _get_config(self):
+        if not await self._client.filesystem.exists(self.PATH):
+            return None
+
+        buf = io.BytesIO()
+        await self._client.filesystem.download(self.PATH, buf)
+        buf.seek(0)
+        return yaml.load(buf)
+
+    async def purge(self):
+        """
+        Remove routing table, check ZFSManager.purge
+        """
+        await self._client.filesystem.remove(self.PATH)
+
+    async def set_config(self, table):
+        """
+        Set configuration of the local routing table in one go, check ZFSManager.config
+        """
+        final = self._valid_table(table)
+        buf = io.BytesIO(yaml.dump(final).encode())
+        await self._client.filesystem.upload(self.PATH, buf)
+
+    async def set_cache(self, destination):
+        """
+        A simple method to set local cache redis, or zdb in one go. It overrides
+        any entries in the routing table.
+        """
+
+        await self.set_config({
+            'pools': {
+                'local': {
+                    '00:FF': destination,
+                }
+            },
+            'lookup': ['local'],
+            'cache': ['local'],
+        })
+
+
+class AsyncPowerManager(PowerManager):
+
+    async def reboot(self):
+        """
+        full reboot of the node
+        """
+        response = await self._client.raw('core.reboot', {}, stream=True)
+        await response.stream()
+
+    async def poweroff(self):
+        """
+        full power off of the node
+        """
+        response = await self._client.raw('core.poweroff', {}, stream=True)
+        await response.stream()
+
+    async def update(self, image):
+        """
+        update the node with given image, and fast reboot into this image, check PowerManager.update
+        """
+
+        args = {
+            'image': image
+        }
+
+        self._image_chk.check(args)
+        response = await self._client.raw('core.update', args, stream=True)
+        await response.stream()
+
+
+class AsyncClient(AsyncBaseClient):
+    """
+    Asyncio client for zero-os. It exposes the same managers as Client, but all methods that talk
+    to the node are coroutines, so a single event loop can keep many jobs in flight
+
+    example:
+        cl = AsyncClient('<host>')
+        await cl.ping()
+        container = await (await cl.container.create('<flist>')).get()
+
+    :note: this requires redis-py with asyncio support (redis>=4.2)
+    """
+    _raw_chk = Client._raw_chk
+    _payload = Client._payload
+
+    def __init__(self, host, port=6379, password="", db=0, ssl=True, timeout=None, codec=None, cache=None,
+                 latency=None, pool=None):
+        """
+        :param codec: codec name or object used to encode payloads and decode results (check Client)
+        :param cache: cache the results of read-mostly json calls (check Client)
+        :param latency: record the latency of the jobs per command (check Client)
+        :param pool: an explicit redis.asyncio ConnectionPool to use instead of connecting to host
+        """
+        aioredis = _get_aioredis()
+        if not aioredis:
+            raise RuntimeError('asyncio support requires redis>=4.2')
+
+        super().__init__(timeout=timeout, codec=codec, cache=cache, latency=latency)
+
+        if pool is not None:
+            self._redis = aioredis.Redis(connection_pool=pool)
+            return
+
+        # the same connections serve the blocking waits, that last up to DefaultTimeout on the server side
+        socket_timeout = max(timeout or 0, DefaultTimeout) + 5
+        socket_keepalive_options = dict()
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_keepalive_options[socket.TCP_KEEPIDLE] = 1
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            socket_keepalive_options[socket.TCP_KEEPINTVL] = 1
+        self._redis = aioredis.Redis(host=host, port=port, password=password, db=db, ssl=ssl,
+                                     socket_timeout=socket_timeout, ssl_cert_reqs=None,
+                                     socket_keepalive=True, socket_keepalive_options=socket_keepalive_options)
+
+    @property
+    def power(self):
+        return self._manager('_power', AsyncPowerManager)
+
+    @property
+    def socat(self):
+        return self._manager('_socat', SocatManager)
+
+    @property
+    def zfs(self):
+        """
+        ZeroFS manager
+        :return:
+        """
+        return self._manager('_zfs', AsyncZFSManager)
+
+    @property
+    def container(self):
+        """
+        Container manager
+        :return:
+        """
+        return self._manager('_container_manager', AsyncContainerManager)
+
+    @property
+    def bridge(self):
+        """
+        Bridge manager
+        :return:
+        """
+        return self._manager('_bridge_manager', BridgeManager)
+
+    @property
+    def disk(self):
+        """
+        Disk manager
+        :return:
+        """
+        return self._manager('_disk_manager', AsyncDiskManager)
+
+    @property
+    def btrfs(self):
+        """
+        Btrfs manager
+        :return:
+        """
+        return self._manager('_btrfs_manager', BtrfsManager)
+
+    @property
+    def zerotier(self):
+        """
+        Zerotier manager
+        :return:
+        """
+        return self._manager('_zerotier', AsyncZerotierManager)
+
+    @property
+    def kvm(self):
+        """
+        KVM manager
+        :return:
+        """
+        return self._manager('_kvm', AsyncKvmManager)
+
+    @property
+    def logger(self):
+        """
+        Logger manager
+        :return:
+        """
+        return self._manager('_logger', Logger)
+
+    @property
+    def nft(self):
+        """
+        NFT manager
+        :return:
+        """
+        return self._manager('_nft', Nft)
+
+    @property
+    def config(self):
+        """
+        Config manager
+        :return:
+        """
+        return self._manager('_config', Config)
+
+    @property
+    def aggregator(self):
+        """
+        Aggregator manager
+        :return:
+        """
+        return self._manager('_aggregator', AggregatorManager)
+
+    @property
+    def rtinfo(self):
+        """
+        RTInfo manager
+        """
+        return self._manager('_rtinfo', RTInfoManager)
+
+    @property
+    def cgroup(self):
+        """
+        Cgroup manager
+        """
+        return self._manager('_cgroup', CGroupManager)
+
+    async def raw(self, command, arguments, queue=None, max_time=None,
+                  stream=False, tags=None, id=None, recurring_period=None):
+        """
+        Implements the low level command call, check Client.raw
+
+        :return: AsyncResponse object
+        """
+        payload = self._payload(command, arguments, queue=queue, max_time=max_time, stream=stream,
+                                tags=tags, id=id, recurring_period=recurring_period)
+        id = payload['id']
+        if self._cache is not None:
+            self._cache.queued(command)
+
+        flag = 'result:{}:flag'.format(id)
+        data = dumps(payload, self._codec)
+        submitted = time.monotonic()
+        await self._redis.rpush('core:default', data)
+        if await self._redis.brpoplpush(flag, flag, DefaultTimeout) is None:
+            raise TimeoutError('failed to queue job {}'.format(id))
+        timing = None
+        if self._latency is not None:
+            timing = (command, submitted, time.monotonic())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s >> g8core.%s(%s)', id, command,
+                         ', '.join(("%s=%s" % (k, v) for k, v in arguments.items())))
+
+        return AsyncResponse(self, id, timing=timing)
+
+    def response_for(self, id):
+        return AsyncResponse(self, id)
+
+    async def close(self):
+        """
+        Close all the connections to the node
+        """
+        await self._redis.connection_pool.disconnect()
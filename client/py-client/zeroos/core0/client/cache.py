@@ -0,0 +1,181 @@
+"""
+Client side cache of json results for read-mostly commands
+"""
+import collections
+import threading
+import time
+
+# default time to live in seconds of the cached commands, commands that are not listed are never cached
+DefaultTTLs = {
+    'info.cpu': 300,
+    'info.os': 300,
+    'info.version': 300,
+    'info.dmi': 300,
+    'info.nic': 30,
+    'info.disk': 30,
+    'info.mem': 5,
+    'config.get': 300,
+    'zerotier.info': 60,
+    'zerotier.list': 10,
+    'corex.list': 5,
+    'corex.find': 5,
+    'kvm.list': 5,
+}
+
+_corex = ('corex.list', 'corex.find')
+_kvm = ('kvm.list',)
+_zerotier = ('zerotier.info', 'zerotier.list')
+
+# commands with side effects and the cached commands they invalidate
+DefaultInvalidations = {
+    'corex.create': _corex,
+    'corex.terminate': _corex,
+    'corex.restore': _corex,
+    'kvm.create': _kvm,
+    'kvm.destroy': _kvm,
+    'kvm.shutdown': _kvm,
+    'kvm.reboot': _kvm,
+    'kvm.reset': _kvm,
+    'kvm.pause': _kvm,
+    'kvm.resume': _kvm,
+    'kvm.migrate': _kvm,
+    'kvm.add_nic': _kvm,
+    'kvm.remove_nic': _kvm,
+    'kvm.attach_disk': _kvm,
+    'kvm.detach_disk': _kvm,
+    'zerotier.join': _zerotier,
+    'zerotier.leave': _zerotier,
+    'bridge.create': ('info.nic',),
+    'bridge.delete': ('info.nic',),
+    'disk.mount': ('info.disk',),
+    'disk.umount': ('info.disk',),
+    'core.update': ('info.version',),
+}
+
+
+class ResultCache:
+    """
+    LRU cache of the raw json results of Client.json with a time to live per command.
+
+    The cache stores the result data as returned by the node and every hit is decoded again, so callers
+    can't alter the cached value by modifying the returned object.
+
+    Commands with side effects invalidate the related cached commands when they are queued (for example
+    corex.create invalidates corex.list). A read that runs concurrently with such a command can still
+    cache the old state until its time to live expires.
+
+    example:
+        cl = Client('10.0.0.1', cache=ResultCache({'info.cpu': 600, 'info.mem': 1}))
+        cl.info.cpu()  # miss
+        cl.info.cpu()  # hit
+        cl.cache.stats()
+    """
+
+    def __init__(self, ttls=None, max_entries=1024, invalidations=None):
+        """
+        :param ttls: dict of {command: seconds} of the commands to cache (default to DefaultTTLs)
+        :param max_entries: max number of cached results, the least recently used results are evicted first
+        :param invalidations: dict of {command: [cached commands]} invalidated when command is queued
+                              (default to DefaultInvalidations)
+        """
+        self._ttls = dict(DefaultTTLs if ttls is None else ttls)
+        self._invalidations = dict(DefaultInvalidations if invalidations is None else invalidations)
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def hits(self):
+        """
+        Number of calls answered from the cache
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        Number of calls to cached commands that went to the node
+        """
+        return self._misses
+
+    def cacheable(self, command):
+        """
+        True if the results of this command are cached
+        """
+        return command in self._ttls
+
+    def get(self, command, key):
+        """
+        Get a cached result
+
+        :param command: command name
+        :param key: hashable key of the command arguments
+        :return: cached result data or None
+        """
+        with self._lock:
+            entry = self._entries.get((command, key))
+            if entry is not None:
+                expires, data = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end((command, key))
+                    self._hits += 1
+                    return data
+                del self._entries[(command, key)]
+            self._misses += 1
+            return None
+
+    def put(self, command, key, data):
+        """
+        Cache a result if the command is cacheable
+
+        :param command: command name
+        :param key: hashable key of the command arguments
+        :param data: result data
+        """
+        ttl = self._ttls.get(command)
+        if ttl is None:
+            return
+
+        with self._lock:
+            self._entries[(command, key)] = (time.monotonic() + ttl, data)
+            self._entries.move_to_end((command, key))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *commands):
+        """
+        Drop the cached results of the given commands, or all cached results if no commands are given
+        """
+        with self._lock:
+            if not commands:
+                self._entries.clear()
+                return
+
+            commands = set(commands)
+            for entry in [entry for entry in self._entries if entry[0] in commands]:
+                del self._entries[entry]
+
+    def queued(self, command):
+        """
+        Called when a command is queued, invalidates the cached results it affects
+        """
+        commands = self._invalidations.get(command)
+        if commands:
+            self.invalidate(*commands)
+
+    def stats(self):
+        """
+        Cache counters
+        :return: dict with hits, misses, evictions and size
+        """
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'size': len(self._entries),
+            }
@@ -1,6 +1,7 @@
 import redis
-import uuid
-import json
+import os
+import itertools
+import math
 import textwrap
 import shlex
 import base64
@@ -13,10 +14,22 @@ import io
 import yaml
 import re
 import urllib
+import collections
+import hashlib
+import threading
+from concurrent import futures
 from . import typchk
+from . import codec as codecs
+from .cache import ResultCache
+from .inventory import Inventory, container_fingerprint
+from .latency import LatencyRecorder
+from .group import GroupResult
 
 
 DefaultTimeout = 10  # seconds
+DefaultMaxConnections = 50  # per pool
+DefaultHealthCheckInterval = 30  # seconds
+ResultExpire = 300  # seconds, how long the node keeps a job result after the job exits
 
 logger = logging.getLogger('g8core')
 
@@ -25,6 +38,26 @@ class JobNotFoundError(Exception):
     pass
 
 
+class SubmitError(RuntimeError):
+    """
+    Submitting a job failed, and the node doesn't know the job (yet). The job might still have been queued and
+    run later, so its outcome is unknown.
+    """
+
+    def __init__(self, id, cause):
+        super().__init__('job {} was submitted but its outcome is unknown: {}'.format(id, cause))
+        self._id = id
+        self._cause = cause
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def cause(self):
+        return self._cause
+
+
 class ResultError(RuntimeError):
     def __init__(self, msg, code=0):
         super().__init__(msg)
@@ -40,10 +73,107 @@ class ResultError(RuntimeError):
         return self._message
 
 
+class Block:
+    """
+    A binary block argument. Blocks are base64 encoded straight into the serialized job payload,
+    without intermediate str copies of the (possibly large) data.
+
+    :param data: bytes-like object (bytes, bytearray or memoryview)
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def data(self):
+        return self._data
+
+    def __repr__(self):
+        return '<block {} bytes>'.format(len(self._data))
+
+
+class _JobIDs:
+    """
+    Job id generator. Ids are formatted like uuids and made of a random per process prefix (80 bits) and a
+    counter, so a new id costs no system call (unlike uuid4) while ids stay unique across processes. The
+    prefix is renewed in forked children.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._prefix = None
+        self._counter = None
+
+    def __call__(self):
+        if self._pid != os.getpid():
+            self._reset()
+        return '%s%012x' % (self._prefix, next(self._counter) & 0xffffffffffff)
+
+    def _reset(self):
+        prefix = base64.b16encode(os.urandom(10)).decode().lower()
+        self._prefix = '{}-{}-{}-{}-'.format(prefix[:8], prefix[8:12], prefix[12:16], prefix[16:])
+        self._counter = itertools.count()
+        self._pid = os.getpid()
+
+
+_job_id = _JobIDs()
+
+
+def _block_timeout(deadline):
+    """
+    Timeout of a blocking redis command that must return by the monotonic deadline (whole seconds, at least 1
+    since 0 blocks forever, and at most DefaultTimeout so it returns before the socket times out)
+    """
+    return max(1, min(DefaultTimeout, int(math.ceil(deadline - time.monotonic()))))
+
+
+_json = codecs.JSONCodec()
+_block_marker = re.compile(rb'"\\u0000block:([0-9]+)\\u0000"')
+
+
+def dumps(payload, codec=None):
+    """
+    Serialize a job payload to json bytes. Block values are spliced in as base64 json strings.
+
+    :param codec: codec used to serialize the payload (default to the standard json codec)
+    """
+    if codec is None:
+        codec = _json
+    blocks = []
+
+    def default(o):
+        if not isinstance(o, Block):
+            raise TypeError('{} is not JSON serializable'.format(type(o)))
+        blocks.append(o)
+        return '\0block:{}\0'.format(len(blocks) - 1)
+
+    text = codec.dumps(payload, default=default)
+    if not blocks:
+        return text
+
+    parts = _block_marker.split(text)
+    for i in range(1, len(parts), 2):
+        parts[i] = b'"' + base64.b64encode(blocks[int(parts[i])].data) + b'"'
+
+    return b''.join(parts)
+
+
 class Return:
+    """
+    Job result. When created from the raw result body, the body is only decoded the first time one of the
+    fields is accessed, so results that are kept around but never read stay as compact bytes.
+    """
+    __slots__ = ('_payload', '_body', '_codec')
 
-    def __init__(self, payload):
+    def __init__(self, payload=None, body=None, codec=None):
+        """
+        :param payload: decoded result object
+        :param body: raw result body (decoded on first access with codec), used if payload is None
+        :param codec: codec to decode the body with (default to json)
+        """
         self._payload = payload
+        self._body = body
+        self._codec = codec
 
     @property
     def payload(self):
@@ -51,6 +181,11 @@ class Return:
         Raw return object data
         :return: dict
         """
+        if self._payload is None:
+            body = self._body
+            if body is not None:
+                self._payload = (self._codec or _json).loads(body)
+                self._body = None
         return self._payload
 
     @property
@@ -59,7 +194,7 @@ class Return:
         Job ID
         :return: string
         """
-        return self._payload['id']
+        return self.payload['id']
 
     @property
     def data(self):
@@ -71,28 +206,37 @@ class Return:
         json object, other levels exists for yaml, toml, etc... it really depends on the running job
         return: python primitive (str, number, dict or array)
         """
-        return self._payload['data']
+        return self.payload['data']
+
+    def json(self):
+        """
+        Decoded data of a json result (level 20).
+
+        The data of a json result is itself a json document carried as a string in the result. It's decoded with
+        the codec that decoded the result, straight from that string (no re-encoding, stripping or other copy).
+        """
+        return (self._codec or _json).loads(self.payload['data'])
 
     @property
     def level(self):
         """
         Data message level (if any)
         """
-        return self._payload['level']
+        return self.payload['level']
 
     @property
     def starttime(self):
         """
         Starttime as a timestamp
         """
-        return self._payload['starttime'] / 1000
+        return self.payload['starttime'] / 1000
 
     @property
     def time(self):
         """
         Execution time in millisecond
         """
-        return self._payload['time']
+        return self.payload['time']
 
     @property
     def state(self):
@@ -100,7 +244,7 @@ class Return:
         Exit state
         :return: str one of [SUCCESS, ERROR, KILLED, TIMEOUT, UNKNOWN_CMD, DUPLICATE_ID]
         """
-        return self._payload['state']
+        return self.payload['state']
 
     @property
     def stdout(self):
@@ -108,7 +252,7 @@ class Return:
         The job stdout
         :return: string or None
         """
-        streams = self._payload.get('streams', None)
+        streams = self.payload.get('streams', None)
         return streams[0] if streams is not None and len(streams) >= 1 else ''
 
     @property
@@ -117,7 +261,7 @@ class Return:
         The job stderr
         :return: string or None
         """
-        streams = self._payload.get('streams', None)
+        streams = self.payload.get('streams', None)
         return streams[1] if streams is not None and len(streams) >= 2 else ''
 
     @property
@@ -129,7 +273,7 @@ class Return:
             exit_code = code - 1000
 
         """
-        return self._payload.get('code', 500)
+        return self.payload.get('code', 500)
 
     def __repr__(self):
         return str(self)
@@ -149,10 +293,22 @@ class Return:
 
 
 class Response:
-    def __init__(self, client, id):
+    __slots__ = ('_client', '_id', '_queue', '_dispatch', '_timing')
+
+    def __init__(self, client, id, dispatch=None, timing=None):
+        """
+        :param client: node client
+        :param id: job ID
+        :param dispatch: Response of the corex.dispatch job that queued this job in a container (if any),
+                         it's checked the first time this job is waited on (check ContainerClient.raw)
+        :param timing: (command, submitted, queued) monotonic times of the job submission, recorded in the
+                       client latency recorder when the result is received (check LatencyRecorder)
+        """
         self._client = client
         self._id = id
         self._queue = 'result:{}'.format(id)
+        self._dispatch = dispatch
+        self._timing = timing
 
     @property
     def id(self):
@@ -171,6 +327,7 @@ class Response:
         after the 5 min is gone, the job result is no more fetchable
         :return: bool
         """
+        self._resolve()
         r = self._client._redis
         flag = '{}:flag'.format(self._queue)
         return bool(r.exists(flag))
@@ -181,14 +338,16 @@ class Response:
         Returns true if job still in running state
         :return:
         """
+        self._resolve()
         r = self._client._redis
         flag = '{}:flag'.format(self._queue)
         if bool(r.exists(flag)):
-            return r.ttl(flag) is None
+            ttl = r.ttl(flag)
+            return ttl is None or ttl < 0
 
         return False
 
-    def stream(self, callback=None):
+    def stream(self, callback=None, batch=1000):
         """
         Runtime copy of job messages. This required the 'stream` flag to be set to True otherwise it will
         not be able to copy any output, while it will block until the process exits.
@@ -209,7 +368,8 @@ class Response:
 
                          Note: if callback is none, a default callback will be used that prints output on stdout/stderr
                          based on level.
-        :return: None
+        :param batch: max number of queued messages to fetch in one round trip (check iter_stream)
+        :return: number of received messages
         """
         if callback is None:
             callback = Response.__default
@@ -217,29 +377,53 @@ class Response:
         if not callable(callback):
             raise Exception('callback must be callable')
 
+        count = 0
+        for level, line, flags in self.iter_stream(batch=batch):
+            callback(level, line, flags)
+            count += 1
+        return count
+
+    def iter_stream(self, batch=1000, timeout=10):
+        """
+        Iterate over the job messages (check stream). Messages that are already queued are drained `batch` at a
+        time in a single round trip, so a job that produces a lot of output doesn't cost a round trip per line.
+
+        The iteration ends after the EOF message or once the process is no longer running.
+
+        example:
+            for level, line, flags in job.iter_stream():
+                print(line, end='')
+
+        :param batch: max number of queued messages to fetch in one round trip
+        :param timeout: max time in seconds to block waiting for a message before checking if the job is still running
+                        (at most DefaultTimeout)
+        :return: generator of (level, message, flags) tuples
+        """
+        self._resolve()
         queue = 'stream:%s' % self.id
-        r = self._client._redis
+        r = self._client._blocking
+        loads = self._client._codec.loads
 
-        # we can terminate quickly by checking if the process is not running and it has no queued output.
-        # if not self.running and r.llen(queue) == 0:
-        #     return
-        count = 0
         while True:
-            data = r.blpop(queue, 10)
+            data = r.blpop(queue, min(timeout, DefaultTimeout))
             if data is None:
                 if not self.running:
-                    break
+                    return
                 continue
-            _, body = data
-            payload = json.loads(body.decode())
-            message = payload['message']
-            line = message['message']
-            meta = message['meta']
-            callback(meta >> 16, line, meta & 0xff)
-            count += 1
-            if meta & 0x6 != 0:
-                break
-        return count
+
+            bodies = [data[1]]
+            while bodies:
+                for body in bodies:
+                    level, line, flags = _stream_message(loads, body)
+                    yield level, line, flags
+                    if flags & 0x6 != 0:
+                        return
+
+                # drain what got queued meanwhile, the transaction makes sure no message is trimmed without being read
+                pipe = r.pipeline()
+                pipe.lrange(queue, 0, batch - 1)
+                pipe.ltrim(queue, batch, -1)
+                bodies, _ = pipe.execute()
 
     @staticmethod
     def __default(level, line, meta):
@@ -259,7 +443,7 @@ class Response:
         """
         if timeout is None:
             timeout = self._client.timeout
-        r = self._client._redis
+        r = self._client._blocking
         start = time.time()
         maxwait = timeout
         while maxwait > 0:
@@ -267,19 +451,43 @@ class Response:
                 raise JobNotFoundError(self.id)
             v = r.brpoplpush(self._queue, self._queue, min(maxwait, 10))
             if v is not None:
-                payload = json.loads(v.decode())
-                r = Return(payload)
-                logger.debug('%s << %s, stdout="%s", stderr="%s", data="%s"',
-                             self._id, r.state, r.stdout, r.stderr, r.data[:1000])
-                return r
+                return self._result(v)
             logger.debug('%s still waiting (%ss)', self._id, int(time.time() - start))
             maxwait -= 10
         raise TimeoutError()
 
+    def _resolve(self):
+        """
+        Make sure the job was dispatched to its container, raise if the dispatch failed
+        """
+        dispatch = self._dispatch
+        if dispatch is None:
+            return
+
+        result = dispatch.get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to dispatch command to container: %s' % result.data)
+        self._dispatch = None
+
+    def _result(self, body):
+        r = Return(body=body, codec=self._client._codec)
+        if self._timing is not None:
+            command, submitted, queued = self._timing
+            self._timing = None
+            exec_time = r.payload.get('time')
+            self._client._latency.record(command, submitted, queued, time.monotonic(),
+                                         exec_time / 1000 if exec_time is not None else None)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s << %s, stdout="%s", stderr="%s", data="%s"',
+                         self._id, r.state, r.stdout, r.stderr, r.data[:1000])
+        return r
+
 
 class JSONResponse(Response):
+    __slots__ = ()
+
     def __init__(self, response):
-        super().__init__(response._client, response.id)
+        super().__init__(response._client, response.id, response._dispatch, response._timing)
 
     def get(self, timeout=None):
         """
@@ -294,7 +502,216 @@ class JSONResponse(Response):
         if result.level != 20:
             raise ResultError('not a json response: %d' % result.level, 406)
 
-        return json.loads(result.data)
+        return result.json()
+
+
+def as_completed(responses, timeout=None):
+    """
+    Waits for many jobs at once and yields their results as they complete. All jobs are checked in
+    a single round trip, then a single multi-key BLPOP waits for the next job to finish, so waiting for
+    N jobs costs a handful of round trips instead of N blocking waits.
+
+    The popped results are pushed back on their queues, so the jobs results can still be read
+    by Response.get (or by other clients) until zero-os forgets about them.
+
+    :note: all the responses must belong to the same client (node)
+
+    :param responses: iterable of Response objects
+    :param timeout: max time to wait for all the jobs to finish in seconds (default to the client timeout)
+    :return: generator of (Response, Return) tuples in completion order
+    """
+    responses = list(responses)
+    if not responses:
+        return
+
+    client = responses[0]._client
+    for response in responses:
+        if response._client._redis.connection_pool is not client._redis.connection_pool:
+            raise ValueError('all responses must belong to the same client')
+
+    if timeout is None:
+        timeout = client.timeout
+
+    r = client._redis
+    pending = {}
+    for response in responses:
+        response._resolve()
+        pending[response._queue] = response
+
+    deadline = time.time() + timeout
+    while True:
+        # one round trip to collect all the jobs that already finished
+        pipeline = r.pipeline(transaction=False)
+        queues = list(pending.keys())
+        for queue in queues:
+            pipeline.exists('{}:flag'.format(queue))
+            pipeline.lindex(queue, -1)
+        values = pipeline.execute()
+
+        for i, queue in enumerate(queues):
+            exists, value = values[2 * i], values[2 * i + 1]
+            response = pending[queue]
+            if value is not None:
+                del pending[queue]
+                yield response, response._result(value)
+            elif not exists:
+                raise JobNotFoundError(response.id)
+
+        if not pending:
+            return
+
+        maxwait = deadline - time.time()
+        if maxwait <= 0:
+            raise TimeoutError()
+
+        v = client._blocking.blpop(list(pending.keys()), max(1, int(min(maxwait, 10))))
+        if v is None:
+            continue
+
+        queue, value = v
+        queue = queue.decode()
+        # push the result back (and restore the queue expiry) so it stays readable
+        pipeline = r.pipeline(transaction=False)
+        pipeline.rpush(queue, value)
+        pipeline.expire(queue, ResultExpire)
+        pipeline.execute()
+
+        response = pending.pop(queue)
+        yield response, response._result(value)
+
+
+def wait_all(responses, timeout=None):
+    """
+    Waits for all jobs to finish (max of given timeout seconds) and return their results.
+    Check as_completed for details.
+
+    :param responses: iterable of Response objects
+    :param timeout: max time to wait for all the jobs to finish in seconds
+    :return: list of Return objects in the same order of responses
+    """
+    responses = list(responses)
+    results = {}
+    for response, result in as_completed(responses, timeout):
+        results[response.id] = result
+
+    return [results[response.id] for response in responses]
+
+
+def wait_any(responses, timeout=None):
+    """
+    Waits for the first job to finish (max of given timeout seconds). Check as_completed for details.
+
+    :param responses: iterable of Response objects
+    :param timeout: max time to wait in seconds
+    :return: (Response, Return) tuple of the first finished job
+    """
+    for response, result in as_completed(responses, timeout):
+        return response, result
+
+    raise ValueError('no responses to wait for')
+
+
+def merge_streams(client, jobs, subscribe=True, max_pending=1000, timeout=10):
+    """
+    Merge the output streams of many jobs into a single iterator, so tailing many jobs doesn't need a
+    blocking thread per job. Messages are tagged with the ID of the job they belong to, the messages of
+    each job come in order, and the iteration ends when all jobs reached their end of stream (or are no
+    longer running).
+
+    Messages are fetched from the node only when the consumer asks for more, and at most max_pending
+    messages (split over the jobs) are fetched in a single round trip. A slow consumer leaves the messages
+    queued on the node instead of growing a buffer in memory.
+
+    example:
+        jobs = [cl.container.client(id).system('tail -f /var/log/app.log') for id in ids]
+        for job_id, level, line, flags in merge_streams(cl, jobs):
+            print(job_id, line, end='')
+
+    :param client: client the jobs run on
+    :param jobs: iterable of job IDs or Response objects
+    :param subscribe: subscribe to the jobs (check BaseClient.subscribe) and read the subscription streams.
+                      If False, the jobs must be Response objects started with stream=True and their own
+                      streams are consumed (check Response.stream)
+    :param max_pending: max number of messages to fetch ahead of the consumer
+    :param timeout: max time in seconds to block waiting for a message before checking if the jobs are still running
+                    (at most DefaultTimeout)
+    :return: generator of (job id, level, message, flags) tuples
+    """
+    streams = {}
+    for job in jobs:
+        id = job.id if isinstance(job, Response) else job
+        if subscribe:
+            response = client.subscribe(id)
+        elif isinstance(job, Response):
+            job._resolve()
+            response = job
+        else:
+            raise ValueError('jobs must be Response objects when subscribe is False')
+        streams['stream:%s' % response.id] = (id, response)
+
+    if not streams:
+        return
+
+    node = next(iter(streams.values()))[1]._client
+    r = node._blocking
+    loads = node._codec.loads
+
+    while streams:
+        # one round trip to drain what is already queued on all streams
+        queues = list(streams.keys())
+        share = max(1, max_pending // len(queues))
+        pipe = r.pipeline()
+        for queue in queues:
+            pipe.lrange(queue, 0, share - 1)
+            pipe.ltrim(queue, share, -1)
+        values = pipe.execute()
+
+        received = False
+        for i, queue in enumerate(queues):
+            for body in values[2 * i]:
+                received = True
+                level, line, flags = _stream_message(loads, body)
+                yield streams[queue][0], level, line, flags
+                if flags & 0x6 != 0:
+                    del streams[queue]
+                    break
+
+        if received or not streams:
+            continue
+
+        data = r.blpop(list(streams.keys()), min(timeout, DefaultTimeout))
+        if data is not None:
+            queue, body = data
+            queue = queue.decode()
+            level, line, flags = _stream_message(loads, body)
+            yield streams[queue][0], level, line, flags
+            if flags & 0x6 != 0:
+                del streams[queue]
+            continue
+
+        # nothing was written for a while, drop the jobs that exited
+        queues = list(streams.keys())
+        pipe = r.pipeline(transaction=False)
+        for queue in queues:
+            flag = 'result:{}:flag'.format(streams[queue][1].id)
+            pipe.exists(flag)
+            pipe.ttl(flag)
+        values = pipe.execute()
+        for i, queue in enumerate(queues):
+            exists, ttl = values[2 * i], values[2 * i + 1]
+            if not exists or (ttl is not None and ttl >= 0):
+                del streams[queue]
+
+
+def _stream_message(loads, body):
+    """
+    Decode a stream message
+
+    :return: (level, message, flags) tuple
+    """
+    message = loads(body)['message']
+    meta = message['meta']
+    return meta >> 16, message['message'], meta & 0xff
 
 
 class InfoManager:
@@ -595,7 +1012,7 @@ class FilesystemManager:
         }
 
         data = self._client.json('filesystem.read', args)
-        return base64.decodebytes(data.encode())
+        return base64.b64decode(data)
 
     def write(self, fd, bytes):
         """
@@ -609,7 +1026,7 @@ class FilesystemManager:
         """
         args = {
             'fd': fd,
-            'block': base64.encodebytes(bytes).decode(),
+            'block': Block(bytes),
         }
 
         return self._client.json('filesystem.write', args)
@@ -626,64 +1043,289 @@ class FilesystemManager:
 
         return self._client.json('filesystem.close', args)
 
-    def upload(self, remote, reader):
+    def upload(self, remote, reader, window=1, chunk_size=512 * 1024):
         """
         Uploads a file
         :param remote: remote file name
         :param reader: an object that implements the read(size) method (typically a file descriptor)
-        :return:
+        :param window: max number of write jobs in flight. Writes are queued on a per file queue on the node
+                       so they are executed in order even if many of them are in flight.
+        :param chunk_size: size of each written block in bytes
+        :return: dict with transfer stats {'size': <bytes>, 'elapsed': <seconds>, 'throughput': <bytes/second>}
         """
-
+        start = time.time()
+        size = 0
         fd = self.open(remote, 'w')
-        while True:
-            chunk = reader.read(512 * 1024)
-            if chunk == b'':
-                break
-            self.write(fd, chunk)
-        self.close(fd)
+        try:
+            queue = self._queue(fd, window)
+            inflight = collections.deque()
+            # the block is serialized as soon as the write job is queued, so a single
+            # buffer is reused for all the chunks if the reader supports readinto
+            buffer = memoryview(bytearray(chunk_size)) if hasattr(reader, 'readinto') else None
+            while True:
+                if buffer is not None:
+                    n = reader.readinto(buffer)
+                    chunk = buffer[:n]
+                else:
+                    chunk = reader.read(chunk_size)
+                    n = len(chunk)
+                if n == 0:
+                    break
+                if len(inflight) >= window:
+                    inflight.popleft().get()
+                inflight.append(self._write(fd, chunk, queue))
+                size += n
+
+            while inflight:
+                inflight.popleft().get()
+        finally:
+            self.close(fd)
 
-    def download(self, remote, writer):
+        return self._stats(remote, size, start)
+
+    def download(self, remote, writer, window=1):
         """
         Downloads a file
         :param remote: remote file name
         :param writer: an object the implements the write(bytes) interface (typical a file descriptor)
-        :return:
+        :param window: max number of read jobs in flight. Reads are queued on a per file queue on the node
+                       so blocks are returned in order. At most `window` blocks are kept in memory.
+        :return: dict with transfer stats {'size': <bytes>, 'elapsed': <seconds>, 'throughput': <bytes/second>}
         """
-
+        start = time.time()
+        size = 0
         fd = self.open(remote)
-        while True:
-            chunk = self.read(fd)
-            if chunk == b'':
-                break
-            writer.write(chunk)
-        self.close(fd)
+        try:
+            queue = self._queue(fd, window)
+            inflight = collections.deque()
+            eof = False
+            while not eof:
+                while len(inflight) < window:
+                    inflight.append(self._read(fd, queue))
+
+                chunk = base64.b64decode(inflight.popleft().get())
+                if chunk == b'':
+                    eof = True
+                    break
+                writer.write(chunk)
+                size += len(chunk)
+
+            # read jobs in flight after the end of file return empty blocks
+            while inflight:
+                inflight.popleft().get()
+        finally:
+            self.close(fd)
 
-    def upload_file(self, remote, local):
+        return self._stats(remote, size, start)
+
+    def _queue(self, fd, window):
+        return 'filesystem:{}'.format(fd) if window > 1 else None
+
+    def _write(self, fd, bytes, queue):
+        args = {
+            'fd': fd,
+            'block': Block(bytes),
+        }
+
+        return JSONResponse(self._client.raw('filesystem.write', args, queue=queue))
+
+    def _read(self, fd, queue):
+        args = {
+            'fd': fd,
+        }
+
+        return JSONResponse(self._client.raw('filesystem.read', args, queue=queue))
+
+    def _stats(self, remote, size, start):
+        elapsed = time.time() - start
+        stats = {
+            'size': size,
+            'elapsed': elapsed,
+            'throughput': size / elapsed if elapsed > 0 else 0,
+        }
+        logger.debug('%s transferred %d bytes in %.2fs (%.2f MiB/s)',
+                     remote, size, elapsed, stats['throughput'] / (1024 * 1024))
+        return stats
+
+    def upload_file(self, remote, local, window=1):
         """
         Uploads a file
         :param remote: remote file name
         :param local: local file name
-        :return:
+        :param window: max number of write jobs in flight (check upload)
+        :return: transfer stats (check upload)
         """
         file = open(local, 'rb')
         try:
-            self.upload(remote, file)
+            return self.upload(remote, file, window=window)
         finally:
             file.close()
 
-    def download_file(self, remote, local):
+    def download_file(self, remote, local, window=1):
         """
         Downloads a file
         :param remote: remote file name
         :param local: local file name
-        :return:
+        :param window: max number of read jobs in flight (check download)
+        :return: transfer stats (check download)
         """
         file = open(local, 'wb')
         try:
-            self.download(remote, file)
+            return self.download(remote, file, window=window)
         finally:
             file.close()
 
+    def sync_file(self, remote, local, block_size=1024 * 1024, batch=16, window=4):
+        """
+        Synchronize a local file to the node, transferring only the blocks that differ.
+
+        The file is split in blocks of block_size, the sha256 of each block is computed locally and on the
+        node (with a bash job), and only the changed blocks are uploaded and patched in place. Patched blocks
+        are hashed again on the node to verify them. If a sync is interrupted, calling sync_file again resumes
+        from where it stopped since all the verified blocks already match.
+
+        :param remote: remote file name
+        :param local: local file name
+        :param block_size: size of the compared blocks in bytes
+        :param batch: number of changed blocks uploaded and patched at once (max batch * block_size bytes
+                      are kept in memory)
+        :param window: max number of write jobs in flight while uploading a batch (check upload)
+        :return: dict with sync stats {'size': <bytes>, 'blocks': <number of blocks>,
+                 'changed': <number of changed blocks>, 'transferred': <bytes>, 'elapsed': <seconds>}
+        """
+        start = time.time()
+        size, hashes = self._local_hashes(local, block_size)
+        remote_size, remote_hashes = self._remote_hashes(remote, block_size)
+        changed = [i for i, h in enumerate(hashes) if remote_hashes.get(i) != h]
+        if remote_size != size:
+            # resize first, so the last (partial) block can be verified once patched
+            self._bash('truncate -s {} {}'.format(size, shlex.quote(remote)), 'failed to truncate remote file')
+
+        patch = '{}.sync-patch'.format(remote)
+        transferred = 0
+
+        with open(local, 'rb') as file:
+            for offset in range(0, len(changed), batch):
+                blocks = changed[offset:offset + batch]
+                buf = self._read_blocks(file, blocks, block_size)
+                transferred += len(buf.getbuffer())
+                self.upload(patch, buf, window=window)
+                self._bash(self._patch_script(patch, remote, block_size, blocks), 'failed to patch remote file')
+
+                _, verified = self._remote_hashes(remote, block_size, blocks)
+                self._verify(remote, blocks, hashes, verified)
+
+        return self._sync_stats(remote, size, hashes, changed, transferred, start)
+
+    @staticmethod
+    def _local_hashes(local, block_size):
+        """
+        :return: tuple of (file size, list of the sha256 of each block)
+        """
+        hashes = []
+        with open(local, 'rb') as file:
+            while True:
+                block = file.read(block_size)
+                if block == b'':
+                    break
+                hashes.append(hashlib.sha256(block).hexdigest())
+            return file.tell(), hashes
+
+    @staticmethod
+    def _read_blocks(file, blocks, block_size):
+        buf = io.BytesIO()
+        for i in blocks:
+            file.seek(i * block_size)
+            buf.write(file.read(block_size))
+        buf.seek(0)
+        return buf
+
+    @staticmethod
+    def _patch_script(patch, remote, block_size, blocks):
+        script = ['set -e']
+        for j, i in enumerate(blocks):
+            script.append('dd if={patch} of={remote} bs={bs} skip={j} seek={i} count=1 conv=notrunc'.format(
+                patch=shlex.quote(patch), remote=shlex.quote(remote), bs=block_size, j=j, i=i,
+            ))
+        script.append('rm -f {}'.format(shlex.quote(patch)))
+        return '\n'.join(script)
+
+    @staticmethod
+    def _verify(remote, blocks, hashes, verified):
+        for i in blocks:
+            if verified.get(i) != hashes[i]:
+                raise RuntimeError('block {} of {} failed verification'.format(i, remote))
+
+    @staticmethod
+    def _sync_stats(remote, size, hashes, changed, transferred, start):
+        stats = {
+            'size': size,
+            'blocks': len(hashes),
+            'changed': len(changed),
+            'transferred': transferred,
+            'elapsed': time.time() - start,
+        }
+        logger.debug('%s synced %d/%d blocks (%d bytes) in %.2fs',
+                     remote, stats['changed'], stats['blocks'], transferred, stats['elapsed'])
+        return stats
+
+    def _remote_hashes(self, remote, block_size, blocks=None):
+        """
+        Hash the blocks of a remote file
+
+        :return: tuple of (file size or None if the file does not exist, dict of {block index: sha256})
+        """
+        # the job result only keeps the last lines of stdout, so the hashes are read from the job stream
+        response = self._client.bash(self._hash_script(remote, block_size, blocks), stream=True)
+        lines = []
+        for level, line, _ in response.iter_stream():
+            if level == 1:
+                lines.extend(line.split())
+        result = response.get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('failed to hash remote file: %s' % result.stderr)
+
+        return self._parse_hashes(lines)
+
+    @staticmethod
+    def _hash_script(remote, block_size, blocks):
+        if blocks is None:
+            blocks = '$(seq 0 $(( (size + bs - 1) / bs - 1 )))'
+        else:
+            blocks = ' '.join(map(str, blocks))
+
+        return textwrap.dedent("""\
+            f={remote}
+            bs={bs}
+            [ -f "$f" ] || exit 0
+            size=$(stat -c %s "$f")
+            echo $size
+            for i in {blocks}; do
+                echo "$i $(dd if="$f" bs=$bs skip=$i count=1 2> /dev/null | sha256sum | cut -d ' ' -f 1)"
+            done
+        """).format(remote=shlex.quote(remote), bs=block_size, blocks=blocks)
+
+    @staticmethod
+    def _parse_hashes(lines):
+        """
+        :param lines: words of the hash script output
+        :return: tuple of (file size or None if the file does not exist, dict of {block index: sha256})
+        """
+        if not lines:
+            return None, {}
+
+        hashes = {}
+        for i, h in zip(lines[1::2], lines[2::2]):
+            hashes[int(i)] = h
+
+        return int(lines[0]), hashes
+
+    def _bash(self, script, error):
+        result = self._client.bash(script).get()
+        if result.state != 'SUCCESS':
+            raise RuntimeError('%s: %s' % (error, result.stderr))
+        return result
+
 
 class BaseClient:
     _system_chk = typchk.Checker({
@@ -699,16 +1341,59 @@ class BaseClient:
         'script': str,
     })
 
-    def __init__(self, timeout=None):
+    def __init__(self, timeout=None, codec=None, cache=None, latency=None):
         if timeout is None:
             self.timeout = DefaultTimeout
         else:
             self.timeout = timeout
-        self._info = InfoManager(self)
-        self._job = JobManager(self)
-        self._process = ProcessManager(self)
-        self._filesystem = FilesystemManager(self)
-        self._ip = IPManager(self)
+        self._codec = codecs.get(codec)
+        if cache is True:
+            cache = ResultCache()
+        self._cache = cache or None
+        if latency is True:
+            latency = LatencyRecorder()
+        self._latency = latency or None
+
+    @property
+    def codec(self):
+        """
+        Codec used to encode job payloads and decode job results
+        :return:
+        """
+        return self._codec
+
+    @property
+    def cache(self):
+        """
+        Result cache of the json calls (None if caching is disabled)
+        :return: ResultCache
+        """
+        return self._cache
+
+    @property
+    def latency(self):
+        """
+        Latency recorder of the jobs (None if the instrumentation is disabled)
+        :return: LatencyRecorder
+        """
+        return self._latency
+
+    def _cache_key(self, command, arguments, tags, id):
+        """
+        Key of the json call in the result cache, or None if the call is not cached
+        """
+        if self._cache is None or tags is not None or id is not None or not self._cache.cacheable(command):
+            return None
+        return self._codec.dumps(arguments)
+
+    def _manager(self, name, cls):
+        """
+        Managers are created on first access, and cached on the client
+        """
+        manager = self.__dict__.get(name)
+        if manager is None:
+            manager = self.__dict__.setdefault(name, cls(self))
+        return manager
 
     @property
     def info(self):
@@ -716,7 +1401,7 @@ class BaseClient:
         info manager
         :return:
         """
-        return self._info
+        return self._manager('_info', InfoManager)
 
     @property
     def job(self):
@@ -724,7 +1409,7 @@ class BaseClient:
         job manager
         :return:
         """
-        return self._job
+        return self._manager('_job', JobManager)
 
     @property
     def process(self):
@@ -732,7 +1417,7 @@ class BaseClient:
         process manager
         :return:
         """
-        return self._process
+        return self._manager('_process', ProcessManager)
 
     @property
     def filesystem(self):
@@ -740,7 +1425,7 @@ class BaseClient:
         filesystem manager
         :return:
         """
-        return self._filesystem
+        return self._manager('_filesystem', FilesystemManager)
 
     @property
     def ip(self):
@@ -748,7 +1433,7 @@ class BaseClient:
         ip manager
         :return:
         """
-        return self._ip
+        return self._manager('_ip', IPManager)
 
     def raw(self, command, arguments, queue=None, max_time=None, stream=False,
             tags=None, id=None, recurring_period=None):
@@ -794,11 +1479,20 @@ class BaseClient:
         if the returned (data) is not of level (20) an error is raised.
         :Return: Data
         """
+        key = self._cache_key(command, arguments, tags, id)
+        if key is not None:
+            data = self._cache.get(command, key)
+            if data is not None:
+                return self._codec.loads(data)
+
         result = self.sync(command, arguments, tags=tags, id=id)
         if result.level != 20:
             raise RuntimeError('invalid result level, expecting json(20) got (%d)' % result.level)
 
-        return json.loads(result.data)
+        if key is not None:
+            self._cache.put(command, key, result.data)
+
+        return result.json()
 
     def ping(self):
         """
@@ -923,7 +1617,7 @@ class ContainerClient(BaseClient):
     })
 
     def __init__(self, client, container):
-        super().__init__(client.timeout)
+        super().__init__(client.timeout, codec=client.codec)
 
         self._client = client
         self._container = container
@@ -949,6 +1643,10 @@ class ContainerClient(BaseClient):
         Implements the low level command call, this needs to build the command structure
         and push it on the correct queue.
 
+        The job ID is generated on the client, so the Response is returned as soon as the corex.dispatch
+        job is queued, without waiting for it to finish. The dispatch result is checked the first time the
+        job is waited on (get, stream, exists, etc...), which raises a RuntimeError if the dispatch failed.
+
         :param command: Command name to execute supported by the node (ex: core.system, info.cpu, etc...)
                         check documentation for list of built in commands
         :param arguments: A dict of required command arguments depends on the command name.
@@ -960,6 +1658,36 @@ class ContainerClient(BaseClient):
         :param id: job id. Generated if not supplied
         :return: Response object
         """
+        args = self._dispatch_args(command, arguments, queue=queue, max_time=max_time, stream=stream,
+                                   tags=tags, id=id, recurring_period=recurring_period)
+
+        response = self._client.raw('corex.dispatch', args)
+        return Response(self._client, args['command']['id'], dispatch=response)
+
+    def raw_batch(self, commands, timeout=None):
+        """
+        Same as self.raw but dispatches many commands to the container at once, in a single pipeline
+        (check Client.raw_batch)
+
+        :param commands: list of dicts, each dict accepts the same keyword arguments as self.raw
+        :param timeout: max time in seconds to wait for the node to queue the whole batch
+        :return: list of Response objects in submission order
+        """
+        dispatches = [self._dispatch_args(**command) for command in commands]
+        responses = self._client.raw_batch([
+            {'command': 'corex.dispatch', 'arguments': args} for args in dispatches
+        ], timeout=timeout)
+
+        return [
+            Response(self._client, args['command']['id'], dispatch=response)
+            for args, response in zip(dispatches, responses)
+        ]
+
+    def _dispatch_args(self, command, arguments, queue=None, max_time=None, stream=False, tags=None, id=None,
+                       recurring_period=None):
+        """
+        Build and validate the corex.dispatch arguments
+        """
         args = {
             'container': self._container,
             'command': {
@@ -969,7 +1697,7 @@ class ContainerClient(BaseClient):
                 'max_time': max_time,
                 'stream': stream,
                 'tags': tags,
-                'id': id,
+                'id': id or _job_id(),
                 'recurring_period': recurring_period,
             },
         }
@@ -977,14 +1705,7 @@ class ContainerClient(BaseClient):
         # check input
         self._raw_chk.check(args)
 
-        response = self._client.raw('corex.dispatch', args)
-
-        result = response.get()
-        if result.state != 'SUCCESS':
-            raise RuntimeError('failed to dispatch command to container: %s' % result.data)
-
-        cmd_id = json.loads(result.data)
-        return self._client.response_for(cmd_id)
+        return args
 
 
 class ContainerManager:
@@ -1056,6 +1777,7 @@ class ContainerManager:
 
     def __init__(self, client):
         self._client = client
+        self._clients = {}
 
     def create(self, root_url, mount=None, host_network=False, nics=DefaultNetworking, port=None,
         hostname=None, privileged=False, storage=None, name=None, tags=None, identity=None, env=None,
@@ -1105,7 +1827,149 @@ class ContainerManager:
         :param cgroups: custom list of cgroups to apply to this container on creation. formated as [(subsystem, name), ...]
                         please refer to the cgroup api for more detailes.
         """
+        args = self._create_args(
+            root_url, mount=mount, host_network=host_network, nics=nics, port=port, hostname=hostname,
+            privileged=privileged, storage=storage, name=name, identity=identity, env=env, cgroups=cgroups,
+        )
+
+        response = self._client.raw('corex.create', args, tags=tags)
+
+        return JSONResponse(response)
+
+    def create_many(self, specs, concurrency=50, timeout=None):
+        """
+        Create many containers concurrently. All specs are validated first, then the creates are submitted
+        in pipelines of up to `concurrency` jobs and the container IDs are collected as the jobs complete, so
+        the whole batch takes about as long as the slowest creates instead of the sum of all of them.
+
+        A spec that fails validation, or a create that fails, doesn't abort the rest of the batch. If submitting
+        a pipeline fails the creates might still have been queued, they are waited on like the others and the
+        ones the node doesn't know about are reported with a SubmitError.
+
+        example:
+            result = cl.container.create_many([
+                {'root_url': flist, 'name': 'web-%d' % i, 'tags': ['web']} for i in range(200)
+            ], concurrency=50, timeout=600)
+
+            for index, container_id in result.results.items():
+                ...
+            result.raise_for_errors()
+
+        :param specs: list of dicts of the create arguments (check create)
+        :param concurrency: max number of creates running on the node at the same time
+        :param timeout: max time in seconds for the whole batch, creates that didn't finish in time are reported
+                        with a TimeoutError (they might still complete on the node)
+                        default to the client timeout for each `concurrency` creates
+        :return: GroupResult of {spec index: container id}
+        """
+        result = GroupResult()
+        jobs = self._create_jobs(specs, result)
+        self._run_many(jobs, self._created, result, concurrency, timeout)
+        return result
+
+    def _create_jobs(self, specs, result):
+        """
+        Validate the create specs, invalid specs are reported in result.errors
+        :return: list of (spec index, raw command dict)
+        """
+        jobs = []
+        for index, spec in enumerate(specs):
+            spec = dict(spec)
+            tags = spec.pop('tags', None)
+            try:
+                args = self._create_args(**spec)
+            except (typchk.Tracker, ValueError, TypeError) as e:
+                result.errors[index] = e
+                continue
+            jobs.append((index, {'command': 'corex.create', 'arguments': args, 'tags': tags}))
+        return jobs
+
+    @staticmethod
+    def _created(ret):
+        if ret.state != 'SUCCESS':
+            raise ResultError(ret.data, ret.code)
+        return ret.json()
 
+    def _run_many(self, jobs, complete, result, concurrency, timeout):
+        """
+        Run jobs with at most `concurrency` of them in flight, new jobs are submitted in a single pipeline
+        (check Client.raw_batch) as soon as others complete
+
+        :param jobs: list of (key, raw_batch command dict)
+        :param complete: callable that gets the job Return object and returns the result of the job (or raises)
+        :param result: GroupResult where the outcome of each job is stored under its key
+        :param concurrency: max number of jobs in flight
+        :param timeout: max time in seconds for all the jobs
+        """
+        start = time.time()
+        concurrency = max(1, concurrency)
+        if timeout is None:
+            timeout = self._client.timeout * max(1, -(-len(jobs) // concurrency))
+        deadline = start + timeout
+
+        pending = {}
+        unknown = {}
+        position = 0
+        while position < len(jobs) or pending:
+            if deadline - time.time() <= 0:
+                break
+
+            if position < len(jobs) and len(pending) < concurrency:
+                batch = jobs[position:position + concurrency - len(pending)]
+                position += len(batch)
+                # payloads are built first so the job ids are known even if the submission fails
+                submit = []
+                for key, command in batch:
+                    try:
+                        submit.append((key, self._client._payload(**command)))
+                    except (typchk.Tracker, ValueError, TypeError) as e:
+                        result.errors[key] = e
+                try:
+                    responses = self._client.raw_batch([payload for _, payload in submit],
+                                                       timeout=deadline - time.time())
+                except Exception as e:
+                    # the jobs might have been queued before the failure
+                    responses = [Response(self._client, payload['id']) for _, payload in submit]
+                    for response in responses:
+                        unknown[response.id] = e
+                for (key, _), response in zip(submit, responses):
+                    pending[response.id] = (key, response)
+
+            if not pending:
+                continue
+
+            try:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError()
+                response, ret = wait_any([response for _, response in pending.values()], remaining)
+            except JobNotFoundError as e:
+                id = e.args[0]
+                key, _ = pending.pop(id)
+                if id in unknown:
+                    e = SubmitError(id, unknown[id])
+                result.errors[key] = e
+                continue
+            except TimeoutError:
+                break
+
+            key, _ = pending.pop(response.id)
+            try:
+                result.results[key] = complete(ret)
+            except Exception as e:
+                result.errors[key] = e
+
+        for key, _ in list(pending.values()) + jobs[position:]:
+            result.errors[key] = TimeoutError('timed out after {}s'.format(timeout))
+
+        result._elapsed = time.time() - start
+
+    def _create_args(self, root_url, mount=None, host_network=False, nics=DefaultNetworking, port=None,
+                     hostname=None, privileged=False, storage=None, name=None, identity=None, env=None,
+                     cgroups=None):
+        """
+        Build and validate the corex.create arguments (check create for the arguments documentation)
+        """
         if nics == self.DefaultNetworking:
             nics = [{'type': 'default'}]
         elif nics is None:
@@ -1129,9 +1993,7 @@ class ContainerManager:
         # validate input
         self._create_chk.check(args)
 
-        response = self._client.raw('corex.create', args, tags=tags)
-
-        return JSONResponse(response)
+        return args
 
     def layer(self, container, flist):
         """
@@ -1156,6 +2018,17 @@ class ContainerManager:
         """
         return self._client.json('corex.list', {})
 
+    def inventory(self):
+        """
+        Local mirror of the containers that reports what changed between polls (check Inventory)
+
+        Containers are compared on their configuration and pid, changes in their runtime stats
+        are not reported.
+
+        :return: Inventory of {container_id: <container info object>}
+        """
+        return Inventory(self._client, 'corex.list', fingerprint=container_fingerprint)
+
     def find(self, *tags):
         """
         Find containers that matches set of tags
@@ -1176,12 +2049,68 @@ class ContainerManager:
         args = {
             'container': int(container),
         }
+        self._clients.pop(int(container), None)
         response = self._client.raw('corex.terminate', args)
 
         result = response.get()
         if result.state != 'SUCCESS':
             raise RuntimeError('failed to terminate container: %s' % result.data)
 
+    def terminate_many(self, containers=None, tags=None, concurrency=20, timeout=None):
+        """
+        Terminate many containers concurrently (check terminate). Terminations are submitted in pipelines
+        with at most `concurrency` of them running on the node at the same time, a failing termination
+        doesn't abort the others.
+
+        example:
+            # terminate all the containers of a tenant, in less than 2 minutes
+            result = cl.container.terminate_many(tags=['tenant-1'], timeout=120)
+            for container, err in result.errors.items():
+                print('failed to terminate', container, err)
+
+        :param containers: list of container IDs
+        :param tags: terminate (also) all the containers that match this set of tags (check find)
+        :param concurrency: max number of terminations running at the same time
+        :param timeout: max time in seconds for the whole operation, terminations that didn't finish in time are
+                        reported with a TimeoutError (they might still complete on the node)
+                        default to the client timeout for each `concurrency` terminations
+        :return: GroupResult of {container id: True}
+        """
+        result = GroupResult()
+        found = (self.find(*tags) or {}) if tags else {}
+        jobs = self._terminate_jobs(containers, found, result)
+        self._run_many(jobs, self._terminated, result, concurrency, timeout)
+        return result
+
+    def _terminate_jobs(self, containers, found, result):
+        """
+        Validate the containers to terminate, invalid IDs are reported in result.errors
+
+        :param found: containers found by tags (check find)
+        :return: list of (container id, raw command dict)
+        """
+        targets = []
+        for container in containers or []:
+            try:
+                self._client_chk.check(container)
+                targets.append(int(container))
+            except (typchk.Tracker, ValueError) as e:
+                result.errors[container] = e
+
+        targets.extend(int(container) for container in found)
+
+        jobs = []
+        for container in sorted(set(targets)):
+            self._clients.pop(container, None)
+            jobs.append((container, {'command': 'corex.terminate', 'arguments': {'container': container}}))
+        return jobs
+
+    @staticmethod
+    def _terminated(ret):
+        if ret.state != 'SUCCESS':
+            raise RuntimeError('failed to terminate container: %s' % ret.data)
+        return True
+
     def nic_add(self, container, nic):
         """
         Hot plug a nic into a container
@@ -1241,10 +2170,17 @@ class ContainerManager:
         :param container: container id
         :return: Client object bound to the specified container id
         Return a ContainerResponse from container.create
+
+        :note: client objects are cached, calling client multiple times with the same container id returns
+               the same client object
         """
 
         self._client_chk.check(container)
-        return ContainerClient(self._client, int(container))
+        container = int(container)
+        client = self._clients.get(container)
+        if client is None:
+            client = self._clients.setdefault(container, ContainerClient(self._client, container))
+        return client
 
     def backup(self, container, url):
         """
@@ -1767,9 +2703,10 @@ class DiskManager:
         if result.level != 20:  # 20 is JSON output.
             raise RuntimeError('invalid response type from disk.list command')
 
-        data = result.data.strip()
-        if data:
-            return json.loads(data)
+        # json decoders skip the surrounding white spaces, so the data is decoded as is (without a stripped copy)
+        data = result.data
+        if data and not data.isspace():
+            return result.json()
         else:
             return {}
 
@@ -1818,9 +2755,9 @@ class DiskManager:
         if result.level != 20:  # 20 is JSON output.
             raise RuntimeError('invalid response type from disk.getinfo command')
 
-        data = result.data.strip()
-        if data:
-            return json.loads(data)
+        data = result.data
+        if data and not data.isspace():
+            return result.json()
         else:
             return {}
 
@@ -2008,7 +2945,7 @@ class BtrfsManager:
 
         self._create_chk.check(args)
 
-        self._client.sync('btrfs.create', args)
+        return self._client.sync('btrfs.create', args)
 
     def device_add(self, mountpoint, *device):
         """
@@ -2028,7 +2965,7 @@ class BtrfsManager:
 
         self._device_chk.check(args)
 
-        self._client.sync('btrfs.device_add', args)
+        return self._client.sync('btrfs.device_add', args)
 
     def device_remove(self, mountpoint, *device):
         """
@@ -2048,7 +2985,7 @@ class BtrfsManager:
 
         self._device_chk.check(args)
 
-        self._client.sync('btrfs.device_remove', args)
+        return self._client.sync('btrfs.device_remove', args)
 
     def subvol_create(self, path):
         """
@@ -2059,7 +2996,7 @@ class BtrfsManager:
             'path': path
         }
         self._subvol_chk.check(args)
-        self._client.sync('btrfs.subvol_create', args)
+        return self._client.sync('btrfs.subvol_create', args)
 
     def subvol_list(self, path):
         """
@@ -2081,7 +3018,7 @@ class BtrfsManager:
 
         self._subvol_chk.check(args)
 
-        self._client.sync('btrfs.subvol_delete', args)
+        return self._client.sync('btrfs.subvol_delete', args)
 
     def subvol_quota(self, path, limit):
         """
@@ -2096,7 +3033,7 @@ class BtrfsManager:
 
         self._subvol_quota_chk.check(args)
 
-        self._client.sync('btrfs.subvol_quota', args)
+        return self._client.sync('btrfs.subvol_quota', args)
 
     def subvol_snapshot(self, source, destination, read_only=False):
         """
@@ -2115,7 +3052,7 @@ class BtrfsManager:
         }
 
         self._subvol_snapshot_chk.check(args)
-        self._client.sync('btrfs.subvol_snapshot', args)
+        return self._client.sync('btrfs.subvol_snapshot', args)
 
 
 class ZerotierManager:
@@ -2412,7 +3349,7 @@ class KvmManager:
         }
         self._migrate_network_chk.check(args)
 
-        self._client.sync('kvm.prepare_migration_target', args, tags=tags)
+        return self._client.sync('kvm.prepare_migration_target', args, tags=tags)
 
     def destroy(self, uuid):
         """
@@ -2425,7 +3362,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.destroy', args)
+        return self._client.sync('kvm.destroy', args)
 
     def shutdown(self, uuid):
         """
@@ -2438,7 +3375,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.shutdown', args)
+        return self._client.sync('kvm.shutdown', args)
 
     def reboot(self, uuid):
         """
@@ -2451,7 +3388,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.reboot', args)
+        return self._client.sync('kvm.reboot', args)
 
     def reset(self, uuid):
         """
@@ -2464,7 +3401,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.reset', args)
+        return self._client.sync('kvm.reset', args)
 
     def pause(self, uuid):
         """
@@ -2477,7 +3414,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.pause', args)
+        return self._client.sync('kvm.pause', args)
 
     def resume(self, uuid):
         """
@@ -2490,7 +3427,7 @@ class KvmManager:
         }
         self._domain_action_chk.check(args)
 
-        self._client.sync('kvm.resume', args)
+        return self._client.sync('kvm.resume', args)
 
     def info(self, uuid):
         """
@@ -2533,7 +3470,7 @@ class KvmManager:
         }
         self._man_disk_action_chk.check(args)
 
-        self._client.sync('kvm.attach_disk', args)
+        return self._client.sync('kvm.attach_disk', args)
 
     def detach_disk(self, uuid, media):
         """
@@ -2550,7 +3487,7 @@ class KvmManager:
         }
         self._man_disk_action_chk.check(args)
 
-        self._client.sync('kvm.detach_disk', args)
+        return self._client.sync('kvm.detach_disk', args)
 
     def add_nic(self, uuid, type, id=None, hwaddr=None):
         """
@@ -2650,7 +3587,7 @@ class KvmManager:
         }
         self._limit_disk_io_action_chk.check(args)
 
-        self._client.sync('kvm.limit_disk_io', args)
+        return self._client.sync('kvm.limit_disk_io', args)
 
     def migrate(self, uuid, desturi):
         """
@@ -2665,7 +3602,7 @@ class KvmManager:
         }
         self._migrate_action_chk.check(args)
 
-        self._client.sync('kvm.migrate', args)
+        return self._client.sync('kvm.migrate', args)
 
     def list(self):
         """
@@ -2675,6 +3612,14 @@ class KvmManager:
         """
         return self._client.json('kvm.list', {})
 
+    def inventory(self):
+        """
+        Local mirror of the configured domains that reports what changed between polls (check Inventory)
+
+        :return: Inventory of {uuid: <domain info object>}
+        """
+        return Inventory(self._client, 'kvm.list', key='uuid')
+
     def get(self, uuid):
         """
         Get machine info
@@ -3164,7 +4109,11 @@ class ZFSManager():
 
     @config.setter
     def config(self, table):
+        final = self._valid_table(table)
+        buf = io.BytesIO(yaml.dump(final).encode())
+        self._client.filesystem.upload(self.PATH, buf)
 
+    def _valid_table(self, table):
         for name, pool in table['pools'].items():
             for hash_range, dest in pool.items():
                 self._valid_hash_range(hash_range)
@@ -3183,8 +4132,8 @@ class ZFSManager():
             'lookup': table['lookup'],
             'cache': table.get('cache', []),
         }
-        buf = io.BytesIO(yaml.dump(final).encode())
-        self._client.filesystem.upload(self.PATH, buf)
+
+        return final
 
     def purge(self):
         """
@@ -3283,6 +4232,84 @@ class PowerManager():
         self._client.raw('core.update', args, stream=True).stream()
 
 
+class NodePool:
+    """
+    Thread safe connection pools to a single node. Short commands and blocking waits (brpoplpush, blpop)
+    are served by two separate pools, so long running waits for job results can't starve the short calls.
+
+    Pools are shared by all the clients that connect to the same node with the same credentials,
+    use NodePool.get to get (or create) the pools of a node.
+    """
+    _lock = threading.Lock()
+    _pools = {}
+
+    def __init__(self, host, port=6379, password="", db=0, ssl=True, socket_timeout=15,
+                 max_connections=DefaultMaxConnections, health_check_interval=DefaultHealthCheckInterval):
+        socket_keepalive_options = dict()
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_keepalive_options[socket.TCP_KEEPIDLE] = 1
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            socket_keepalive_options[socket.TCP_KEEPINTVL] = 1
+
+        kwargs = dict(
+            host=host, port=port, password=password, db=db,
+            socket_timeout=socket_timeout, socket_keepalive=True, socket_keepalive_options=socket_keepalive_options,
+            health_check_interval=health_check_interval, max_connections=max_connections,
+        )
+        if ssl:
+            kwargs.update(connection_class=redis.SSLConnection, ssl_cert_reqs=None)
+
+        self._commands = redis.BlockingConnectionPool(**kwargs)
+        # the blocking waits of the clients last up to DefaultTimeout on the server side, whatever the
+        # client timeout is, so the socket must not time out before
+        kwargs['socket_timeout'] = max(socket_timeout, DefaultTimeout + 5)
+        self._blocking = redis.BlockingConnectionPool(**kwargs)
+
+    @classmethod
+    def get(cls, host, port=6379, password="", db=0, ssl=True, socket_timeout=15,
+            max_connections=DefaultMaxConnections, health_check_interval=DefaultHealthCheckInterval):
+        """
+        Get the shared pools of a node, the pools are created on first use, so the pools settings
+        (max_connections, health_check_interval, socket_timeout) of the first call are the ones that apply.
+        The socket timeout of the blocking pool is never below DefaultTimeout + 5 seconds.
+
+        :param max_connections: max number of connections in each pool, callers block until a connection
+                                is free once all the connections are in use.
+        :param health_check_interval: idle connections are pinged before reuse if they were idle more than
+                                      this amount of seconds (0 to disable)
+        :return: NodePool
+        """
+        key = (host, port, password, db, ssl)
+        with cls._lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(host, port=port, password=password, db=db, ssl=ssl, socket_timeout=socket_timeout,
+                           max_connections=max_connections, health_check_interval=health_check_interval)
+                cls._pools[key] = pool
+            return pool
+
+    @property
+    def commands(self):
+        """
+        Connection pool for short commands
+        """
+        return self._commands
+
+    @property
+    def blocking(self):
+        """
+        Connection pool for blocking waits
+        """
+        return self._blocking
+
+    def disconnect(self):
+        """
+        Close all the connections of the pools
+        """
+        self._commands.disconnect()
+        self._blocking.disconnect()
+
+
 class Client(BaseClient):
     _raw_chk = typchk.Checker({
         'id': str,
@@ -3295,53 +4322,81 @@ class Client(BaseClient):
         'recurring_period': typchk.Or(typchk.IsNone(), int)
     })
 
-    def __init__(self, host, port=6379, password="", db=0, ssl=True, timeout=None, testConnectionAttempts=3):
-        super().__init__(timeout=timeout)
+    def __init__(self, host, port=6379, password="", db=0, ssl=True, timeout=None, testConnectionAttempts=3,
+                 max_connections=DefaultMaxConnections, health_check_interval=DefaultHealthCheckInterval, pool=None,
+                 testConnectionAsync=False, codec=None, cache=None, latency=None):
+        """
+        :param testConnectionAttempts: number of pings to try before giving up on the node (0 to skip the test)
+        :param testConnectionAsync: if True, the connection test runs in the background instead of blocking
+                                    the constructor, the first command waits for the test to finish, and raises
+                                    ConnectionError if the node is not reachable
+        :param max_connections: max number of connections to the node (check NodePool.get)
+        :param health_check_interval: health check interval of idle connections in seconds (check NodePool.get)
+        :param pool: an explicit NodePool to use, by default clients to the same node share the same pools
+        :param codec: codec name ('json', 'orjson') or object used to encode payloads and decode results,
+                      by default the fastest available codec is used (check codec.available)
+        :param cache: cache the results of read-mostly json calls (info.cpu, config.get, etc...). True to use
+                      a ResultCache with the default time to live per command, or a ResultCache object
+        :param latency: record the latency of the jobs per command (check LatencyRecorder). True to use a
+                        LatencyRecorder with the default settings, or a LatencyRecorder object
+        """
+        super().__init__(timeout=timeout, codec=codec, cache=cache, latency=latency)
+
+        if pool is None:
+            socket_timeout = (timeout + 5) if timeout else 15
+            pool = NodePool.get(host, port=port, password=password, db=db, ssl=ssl, socket_timeout=socket_timeout,
+                                max_connections=max_connections, health_check_interval=health_check_interval)
+
+        self._pool = pool
+        self._redis = redis.Redis(connection_pool=pool.commands)
+        self._blocking = redis.Redis(connection_pool=pool.blocking)
+        self._connection_test = None
+
+        if not testConnectionAttempts:
+            return
 
-        socket_timeout = (timeout + 5) if timeout else 15
-        socket_keepalive_options = dict()
-        if hasattr(socket, 'TCP_KEEPIDLE'):
-            socket_keepalive_options[socket.TCP_KEEPIDLE] = 1
-        if hasattr(socket, 'TCP_KEEPINTVL'):
-            socket_keepalive_options[socket.TCP_KEEPINTVL] = 1
-        if hasattr(socket, 'TCP_KEEPIDLE'):
-            socket_keepalive_options[socket.TCP_KEEPIDLE] = 1
-        self._redis = redis.Redis(host=host, port=port, password=password, db=db, ssl=ssl,
-                                  socket_timeout=socket_timeout, ssl_cert_reqs=None,
-                                  socket_keepalive=True, socket_keepalive_options=socket_keepalive_options)
-        self._container_manager = ContainerManager(self)
-        self._bridge_manager = BridgeManager(self)
-        self._disk_manager = DiskManager(self)
-        self._btrfs_manager = BtrfsManager(self)
-        self._zerotier = ZerotierManager(self)
-        self._kvm = KvmManager(self)
-        self._logger = Logger(self)
-        self._nft = Nft(self)
-        self._config = Config(self)
-        self._aggregator = AggregatorManager(self)
-        self._rtinfo = RTInfoManager(self)
-        self._cgroup = CGroupManager(self)
-        self._zfs = ZFSManager(self)
-        self._socat = SocatManager(self)
-        self._power = PowerManager(self)
-
-        if testConnectionAttempts:
-            for _ in range(testConnectionAttempts):
-                try:
-                    self.ping()
-                except Exception:
-                    pass
-                else:
-                    return
-            raise ConnectionError("Could not connect to remote host %s" % host)
+        if not testConnectionAsync:
+            self._test_connection(host, testConnectionAttempts)
+            return
+
+        future = futures.Future()
+
+        def test():
+            try:
+                self._test_connection(host, testConnectionAttempts)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+        self._connection_test = future
+        threading.Thread(target=test, daemon=True).start()
+
+    def _test_connection(self, host, attempts):
+        for _ in range(attempts):
+            try:
+                # ping without going through raw, which waits for the connection test
+                JSONResponse(self._push(self._payload('core.ping', {}))).get()
+            except Exception:
+                pass
+            else:
+                return
+        raise ConnectionError("Could not connect to remote host %s" % host)
+
+    def _wait_connection(self):
+        if self._connection_test is None:
+            return
+
+        self._connection_test.result()
+        self._connection_test = None
 
     @property
     def power(self):
-        return self._power
+        return self._manager('_power', PowerManager)
 
     @property
     def socat(self):
-        return self._socat
+        return self._manager('_socat', SocatManager)
 
     @property
     def zfs(self):
@@ -3349,7 +4404,7 @@ class Client(BaseClient):
         ZeroFS manager
         :return:
         """
-        return self._zfs
+        return self._manager('_zfs', ZFSManager)
 
     @property
     def container(self):
@@ -3357,7 +4412,7 @@ class Client(BaseClient):
         Container manager
         :return:
         """
-        return self._container_manager
+        return self._manager('_container_manager', ContainerManager)
 
     @property
     def bridge(self):
@@ -3365,7 +4420,7 @@ class Client(BaseClient):
         Bridge manager
         :return:
         """
-        return self._bridge_manager
+        return self._manager('_bridge_manager', BridgeManager)
 
     @property
     def disk(self):
@@ -3373,7 +4428,7 @@ class Client(BaseClient):
         Disk manager
         :return:
         """
-        return self._disk_manager
+        return self._manager('_disk_manager', DiskManager)
 
     @property
     def btrfs(self):
@@ -3381,7 +4436,7 @@ class Client(BaseClient):
         Btrfs manager
         :return:
         """
-        return self._btrfs_manager
+        return self._manager('_btrfs_manager', BtrfsManager)
 
     @property
     def zerotier(self):
@@ -3389,7 +4444,7 @@ class Client(BaseClient):
         Zerotier manager
         :return:
         """
-        return self._zerotier
+        return self._manager('_zerotier', ZerotierManager)
 
     @property
     def kvm(self):
@@ -3397,7 +4452,7 @@ class Client(BaseClient):
         KVM manager
         :return:
         """
-        return self._kvm
+        return self._manager('_kvm', KvmManager)
 
     @property
     def logger(self):
@@ -3405,7 +4460,7 @@ class Client(BaseClient):
         Logger manager
         :return:
         """
-        return self._logger
+        return self._manager('_logger', Logger)
 
     @property
     def nft(self):
@@ -3413,7 +4468,7 @@ class Client(BaseClient):
         NFT manager
         :return:
         """
-        return self._nft
+        return self._manager('_nft', Nft)
 
     @property
     def config(self):
@@ -3421,7 +4476,7 @@ class Client(BaseClient):
         Config manager
         :return:
         """
-        return self._config
+        return self._manager('_config', Config)
 
     @property
     def aggregator(self):
@@ -3429,21 +4484,21 @@ class Client(BaseClient):
         Aggregator manager
         :return:
         """
-        return self._aggregator
+        return self._manager('_aggregator', AggregatorManager)
 
     @property
     def rtinfo(self):
         """
         RTInfo manager
         """
-        return self._rtinfo
+        return self._manager('_rtinfo', RTInfoManager)
 
     @property
     def cgroup(self):
         """
         Cgroup manager
         """
-        return self._cgroup
+        return self._manager('_cgroup', CGroupManager)
 
     def raw(self, command, arguments, queue=None, max_time=None,
             stream=False, tags=None, id=None, recurring_period=None):
@@ -3462,8 +4517,103 @@ class Client(BaseClient):
         :param id: job id. Generated if not supplied
         :return: Response object
         """
+        self._wait_connection()
+        payload = self._payload(command, arguments, queue=queue, max_time=max_time, stream=stream,
+                                tags=tags, id=id, recurring_period=recurring_period)
+        if self._cache is not None:
+            self._cache.queued(command)
+
+        return self._push(payload)
+
+    def _push(self, payload):
+        id = payload['id']
+        flag = 'result:{}:flag'.format(id)
+        data = dumps(payload, self._codec)
+        submitted = time.monotonic()
+        self._redis.rpush('core:default', data)
+        if self._blocking.brpoplpush(flag, flag, DefaultTimeout) is None:
+            raise TimeoutError('failed to queue job {}'.format(id))
+        timing = None
+        if self._latency is not None:
+            timing = (payload['command'], submitted, time.monotonic())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s >> g8core.%s(%s)', id, payload['command'],
+                         ', '.join(("%s=%s" % (k, v) for k, v in payload['arguments'].items())))
+
+        return Response(self, id, timing=timing)
+
+    def raw_batch(self, commands, timeout=None):
+        """
+        Same as self.raw but submits many commands at once. All the commands are queued in a single
+        redis pipeline and their queued flags are confirmed together, so the whole batch costs a few
+        network round trips instead of two blocking round trips per command.
+
+        example:
+            responses = client.raw_batch([
+                {'command': 'info.cpu', 'arguments': {}},
+                {'command': 'core.system', 'arguments': {...}, 'stream': True},
+            ])
+
+        :param commands: list of dicts, each dict accepts the same keyword arguments as self.raw
+                         (command, arguments, queue, max_time, stream, tags, id, recurring_period)
+        :param timeout: max time in seconds to wait for the node to queue the whole batch
+                        (default to DefaultTimeout, at least a second)
+        :return: list of Response objects in submission order
+        """
+        self._wait_connection()
+        payloads = [self._payload(**command) for command in commands]
+        if not payloads:
+            return []
+
+        if self._cache is not None:
+            for payload in payloads:
+                self._cache.queued(payload['command'])
+
+        flags = ['result:{}:flag'.format(payload['id']) for payload in payloads]
+        self._redis.rpush('core:default', *[dumps(payload, self._codec) for payload in payloads])
+        submitted = time.monotonic()
+        deadline = submitted + max(1, DefaultTimeout if timeout is None else timeout)
+
+        # commands are consumed from core:default in order, so once the flag of the last command is set
+        # the others are normally set too: a single blocking wait covers the batch, and the other flags
+        # are confirmed at once. Flags that are still missing are waited on until the same deadline.
+        self._wait_flag(flags[-1], deadline)
+        pipeline = self._redis.pipeline(transaction=False)
+        for flag in flags:
+            pipeline.exists(flag)
+        missing = [flag for flag, exists in zip(flags, pipeline.execute()) if not exists]
+
+        failed = [flag.split(':')[1] for flag in missing if not self._wait_flag(flag, deadline)]
+        if failed:
+            raise TimeoutError('failed to queue jobs {}'.format(', '.join(failed)))
+
+        queued = time.monotonic()
+        responses = []
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for payload in payloads:
+            timing = None
+            if self._latency is not None:
+                timing = (payload['command'], submitted, queued)
+            if debug:
+                logger.debug('%s >> g8core.%s(...)', payload['id'], payload['command'])
+            responses.append(Response(self, payload['id'], timing=timing))
+
+        return responses
+
+    def _wait_flag(self, flag, deadline):
+        """
+        Wait for a queued flag until the monotonic deadline
+        :return: True if the flag is set
+        """
+        while time.monotonic() < deadline:
+            if self._blocking.brpoplpush(flag, flag, _block_timeout(deadline)) is not None:
+                return True
+        return False
+
+    def _payload(self, command, arguments, queue=None, max_time=None,
+                 stream=False, tags=None, id=None, recurring_period=None):
         if not id:
-            id = str(uuid.uuid4())
+            id = _job_id()
 
         payload = {
             'id': id,
@@ -3477,13 +4627,7 @@ class Client(BaseClient):
         }
 
         self._raw_chk.check(payload)
-        flag = 'result:{}:flag'.format(id)
-        self._redis.rpush('core:default', json.dumps(payload))
-        if self._redis.brpoplpush(flag, flag, DefaultTimeout) is None:
-            TimeoutError('failed to queue job {}'.format(id))
-        logger.debug('%s >> g8core.%s(%s)', id, command, ', '.join(("%s=%s" % (k, v) for k, v in arguments.items())))
-
-        return Response(self, id)
+        return payload
 
     def response_for(self, id):
         return Response(self, id)
@@ -0,0 +1,102 @@
+"""
+Wire codecs used to serialize job payloads and decode job results.
+
+Zero-OS speaks json on its queues, so all codecs here produce and accept json, but not the same bytes or
+edge cases:
+
+- orjson writes compact utf-8, the json module adds spaces after separators and escapes non ascii characters
+- orjson can't encode integers wider than 64 bits or strings with lone surrogates, and can't decode numbers
+  out of the double range or lone surrogates. The orjson codec falls back to the json module for those values
+- orjson encodes NaN and infinity as null (the json module writes NaN and Infinity, that zero-os rejects),
+  and decodes integers wider than 64 bits as floats (zero-os never sends such integers)
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONCodec:
+    """
+    Codec based on the python standard json module
+    """
+    name = 'json'
+
+    def dumps(self, obj, default=None):
+        """
+        Serialize obj to json bytes
+
+        :param default: called for objects that can't otherwise be serialized (check json.dumps)
+        :return: bytes
+        """
+        return json.dumps(obj, default=default).encode()
+
+    def loads(self, data):
+        """
+        Load json data (bytes or str)
+        """
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode()
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec based on orjson, it decodes straight from bytes and is considerably faster for large results.
+    Values orjson doesn't support are handled by the json module (check the module documentation)
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError('orjson codec requires the orjson package')
+
+    def dumps(self, obj, default=None):
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, default=default)
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+_codecs = {
+    JSONCodec.name: JSONCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+
+
+def available():
+    """
+    Names of the codecs that can be used in this environment, fastest first
+    """
+    names = [JSONCodec.name]
+    if orjson is not None:
+        names.insert(0, OrjsonCodec.name)
+    return names
+
+
+def get(codec=None):
+    """
+    Get a codec
+
+    :param codec: codec name, codec object (returned as is), or None to negotiate the fastest
+                  codec available in this environment
+    :return: codec object
+    """
+    if codec is None:
+        codec = available()[0]
+
+    if not isinstance(codec, str):
+        return codec
+
+    if codec not in _codecs:
+        raise ValueError('unknown codec "{}", supported codecs are {}'.format(codec, ', '.join(_codecs)))
+
+    return _codecs[codec]()
@@ -0,0 +1,373 @@
+"""
+Client side time series of the aggregator metrics of many nodes
+"""
+import array
+import logging
+import math
+import threading
+import time
+
+from .group import ClientGroup
+
+logger = logging.getLogger('g8core')
+
+_numpy = None
+
+
+def _get_numpy():
+    """
+    numpy (or False if it's not installed), imported on first use so importing the client doesn't pay for it
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+class Series:
+    """
+    Ring buffer of the (time, value) samples of a single metric.
+
+    Samples are kept in fixed size columns (array of doubles): the raw samples, and a downsampled copy where
+    every `downsample` raw samples are summarized into one point (their mean, min and max), so the same memory
+    covers a much longer history at a lower resolution. Window queries read the raw samples for the part of
+    the window they still cover, and the downsampled points for the older part.
+    """
+    __slots__ = ('_raw', '_coarse', '_downsample', '_pending', '_pending_sum', '_pending_min', '_pending_max',
+                 '_lock')
+
+    def __init__(self, size=720, downsample=12, coarse_size=720):
+        """
+        :param size: number of raw samples to keep
+        :param downsample: number of raw samples summarized into one downsampled point
+        :param coarse_size: number of downsampled points to keep
+        """
+        self._raw = _Ring(size)
+        self._coarse = _Ring(coarse_size, columns=3)
+        self._downsample = downsample
+        self._pending = 0
+        self._pending_sum = 0.0
+        self._pending_min = math.inf
+        self._pending_max = -math.inf
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._raw)
+
+    def append(self, timestamp, value):
+        """
+        Add a sample, samples that are not newer than the last one are ignored
+
+        :param timestamp: sample time in seconds
+        :param value: sample value
+        """
+        with self._lock:
+            if len(self._raw) and timestamp <= self._raw.last_time():
+                return False
+
+            self._raw.append(timestamp, value)
+            self._pending += 1
+            self._pending_sum += value
+            self._pending_min = min(self._pending_min, value)
+            self._pending_max = max(self._pending_max, value)
+            if self._pending == self._downsample:
+                self._coarse.append(timestamp, self._pending_sum / self._pending, self._pending_min,
+                                    self._pending_max)
+                self._pending = 0
+                self._pending_sum = 0.0
+                self._pending_min = math.inf
+                self._pending_max = -math.inf
+            return True
+
+    def _window(self, seconds, now):
+        """
+        Downsampled points and raw samples of a window. The downsampled points only cover the part of the
+        window that is older than the raw samples.
+
+        :return: (coarse times, means, mins, maxs, raw times, values) arrays in chronological order
+        """
+        with self._lock:
+            if not len(self._raw):
+                empty = array.array('d')
+                return empty, empty, empty, empty, empty, empty
+
+            if now is None:
+                now = self._raw.last_time()
+            start = now - seconds
+
+            times, (values,) = self._raw.ordered()
+            first = times[0]
+            if first > start and len(self._coarse):
+                coarse, (means, mins, maxs) = self._coarse.ordered()
+            else:
+                coarse = means = mins = maxs = array.array('d')
+
+        lo = _bisect(coarse, start)
+        hi = min(_bisect(coarse, first), _bisect(coarse, now, right=True))
+        coarse, means, mins, maxs = coarse[lo:hi], means[lo:hi], mins[lo:hi], maxs[lo:hi]
+
+        lo = _bisect(times, start)
+        hi = _bisect(times, now, right=True)
+        return coarse, means, mins, maxs, times[lo:hi], values[lo:hi]
+
+    def window(self, seconds, now=None):
+        """
+        Samples of the last `seconds` seconds, the part of the window older than the raw samples is made of
+        the downsampled points (means)
+
+        :param seconds: window length in seconds
+        :param now: end of the window (default to the last sample time)
+        :return: (times, values) arrays in chronological order
+        """
+        coarse, means, _, _, times, values = self._window(seconds, now)
+        return coarse + times, means + values
+
+    def last(self):
+        """
+        Last sample
+        :return: (time, value) or None
+        """
+        with self._lock:
+            if not len(self._raw):
+                return None
+            return self._raw.last_time(), self._raw.last_value()
+
+    def rate(self, seconds, now=None):
+        """
+        Average change per second of the value over the window (for counters)
+        """
+        times, values = self.window(seconds, now)
+        if len(times) < 2 or times[-1] == times[0]:
+            return None
+        return (values[-1] - values[0]) / (times[-1] - times[0])
+
+    def max(self, seconds, now=None):
+        _, _, _, maxs, _, values = self._window(seconds, now)
+        values = maxs + values
+        if not len(values):
+            return None
+        return _reduce('max', values)
+
+    def min(self, seconds, now=None):
+        _, _, mins, _, _, values = self._window(seconds, now)
+        values = mins + values
+        if not len(values):
+            return None
+        return _reduce('min', values)
+
+    def mean(self, seconds, now=None):
+        _, means, _, _, _, values = self._window(seconds, now)
+        count = len(means) * self._downsample + len(values)
+        if not count:
+            return None
+        return (_reduce('sum', means) * self._downsample + _reduce('sum', values)) / count
+
+    def percentile(self, seconds, q, now=None):
+        """
+        q-th percentile (0-100) of the values over the window, linear interpolation between the closest samples.
+        Each downsampled point counts as `downsample` samples of its mean value.
+        """
+        _, means, _, _, _, values = self._window(seconds, now)
+        if len(means):
+            values = array.array('d', (mean for mean in means for _ in range(self._downsample))) + values
+        if not len(values):
+            return None
+        numpy = _get_numpy()
+        if numpy:
+            return float(numpy.percentile(numpy.frombuffer(values), q))
+
+        values = sorted(values)
+        rank = (len(values) - 1) * q / 100
+        lo = int(math.floor(rank))
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (rank - lo)
+
+    def p95(self, seconds, now=None):
+        return self.percentile(seconds, 95, now)
+
+
+class _Ring:
+    """
+    Fixed size columns of times and values
+    """
+    __slots__ = ('_times', '_values', '_size', '_next', '_count')
+
+    def __init__(self, size, columns=1):
+        self._times = array.array('d', bytes(8 * size))
+        self._values = [array.array('d', bytes(8 * size)) for _ in range(columns)]
+        self._size = size
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, *values):
+        self._times[self._next] = timestamp
+        for column, value in zip(self._values, values):
+            column[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def last_time(self):
+        return self._times[self._next - 1]
+
+    def last_value(self):
+        return self._values[0][self._next - 1]
+
+    def ordered(self):
+        """
+        :return: (times, [values of each column]) in chronological order
+        """
+        if self._count < self._size:
+            return self._times[:self._count], [column[:self._count] for column in self._values]
+        return (self._times[self._next:] + self._times[:self._next],
+                [column[self._next:] + column[:self._next] for column in self._values])
+
+
+def _reduce(name, values):
+    """
+    max, min or sum of an array of doubles, with numpy if it's available
+    """
+    numpy = _get_numpy()
+    if numpy:
+        return float(getattr(numpy.frombuffer(values), name)())
+    return {'max': max, 'min': min, 'sum': math.fsum}[name](values)
+
+
+def _bisect(times, value, right=False):
+    lo, hi = 0, len(times)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] < value or (right and times[mid] == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class MetricsCollector:
+    """
+    Samples the aggregator (check AggregatorManager.query) of many nodes on a schedule and keeps the
+    samples in memory, so dashboards can query windows of the metrics locally instead of asking every node.
+
+    example:
+        collector = MetricsCollector({'node1': Client('10.0.0.1'), 'node2': Client('10.0.0.2')},
+                                     key='machine.CPU.percent', interval=10)
+        collector.start()
+        ...
+        for node, series in collector.series('machine.CPU.percent/0').items():
+            print(node, series.p95(300), series.max(3600))
+    """
+
+    def __init__(self, clients, key=None, tags=None, interval=10, size=720, downsample=12, coarse_size=720):
+        """
+        :param clients: ClientGroup or dict of {name: client}
+        :param key: metric key to sample (default to all metrics)
+        :param tags: tags filter (check AggregatorManager.query)
+        :param interval: seconds between sampling rounds
+        :param size: number of raw samples to keep per metric (check Series)
+        :param downsample: number of raw samples averaged into one downsampled point
+        :param coarse_size: number of downsampled points to keep per metric
+        """
+        self._group = clients if isinstance(clients, ClientGroup) else ClientGroup(clients)
+        self._key = key
+        self._tags = tags or {}
+        self._interval = interval
+        self._size = size
+        self._downsample = downsample
+        self._coarse_size = coarse_size
+        self._series = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    @property
+    def errors(self):
+        """
+        Errors of the nodes that failed during the last sampling round
+        :return: dict of {node: exception}
+        """
+        return self._errors
+
+    def collect(self):
+        """
+        Run a single sampling round on all nodes concurrently
+
+        :return: number of new samples
+        """
+        key, tags = self._key, self._tags
+        result = self._group.map(lambda client: client.aggregator.query(key, **tags), timeout=self._interval)
+
+        count = 0
+        with self._lock:
+            for node, states in result.results.items():
+                for metric, state in states.items():
+                    timestamp = state.get('last_time', -1)
+                    if timestamp < 0:
+                        continue
+                    series = self._series.get((node, metric))
+                    if series is None:
+                        series = Series(self._size, self._downsample, self._coarse_size)
+                        self._series[(node, metric)] = series
+                    if series.append(timestamp, state['last_value']):
+                        count += 1
+            self._errors = result.errors
+        return count
+
+    def series(self, metric, node=None):
+        """
+        Series of a metric
+
+        :param metric: metric key as returned by the aggregator (key[/id])
+        :param node: node name, if not set the series of all nodes are returned
+        :return: Series (or None) if node is set, dict of {node: Series} otherwise
+        """
+        with self._lock:
+            if node is not None:
+                return self._series.get((node, metric))
+            return {n: series for (n, m), series in self._series.items() if m == metric}
+
+    def metrics(self):
+        """
+        Sampled metric keys
+        :return: set of metric keys
+        """
+        with self._lock:
+            return {metric for _, metric in self._series}
+
+    def start(self):
+        """
+        Start sampling in a background thread
+        """
+        if self._thread is not None:
+            return
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background sampling
+        """
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, stop):
+        while not stop.is_set():
+            start = time.monotonic()
+            try:
+                self.collect()
+            except Exception:
+                logger.exception('failed to collect aggregator metrics')
+            stop.wait(max(0, self._interval - (time.monotonic() - start)))
@@ -0,0 +1,602 @@
+"""
+In process stand-in of a zero-os node, for testing and benchmarking the client without a real node.
+
+The fake node speaks the same redis queue protocol as core0: it consumes jobs from `core:default`, sets the
+`result:<id>:flag` queued flag, pushes the job output to `stream:<id>` (for jobs started with stream=True)
+and the job result to `result:<id>`. Only a subset of the built in commands is implemented (core.*, info.*,
+filesystem.*, corex.*, process.list, kvm.list, aggregator.query), with synthetic data whose size and latency
+are configurable.
+
+It runs against a local redis-server, or against an embedded redis (fakeredis) when no server is given.
+
+Like core0, core.subscribe forwards the output of a running job to the stream of the subscription, and fails
+for jobs that already exited.
+
+Files live in memory. When a root directory is given, bash jobs run for real with root as working directory
+and see the node files under it, so scripts must use paths relative to root. Like core0, the job results only
+keep the last StreamBufferSize lines of stdout and stderr, while stream jobs get the whole output.
+
+example:
+    node = FakeNode(latency=0.001, sizes={'corex.list': 500})
+    node.start()
+    cl = node.client()
+    cl.ping()
+    node.stop()
+"""
+import base64
+import collections
+import json
+import os
+import subprocess
+import threading
+import time
+import uuid
+from concurrent import futures
+
+import redis
+
+from .asyncclient import AsyncClient
+from .client import Client, NodePool, ResultExpire
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+# number of entries (or lines) in the synthetic results
+DefaultSizes = {
+    'process.list': 50,
+    'corex.list': 10,
+    'kvm.list': 5,
+    'aggregator.query': 100,
+    'info.nic': 4,
+    'info.disk': 4,
+    'lines': 10,
+}
+
+ReadBlockSize = 512 * 1024
+
+# number of stdout/stderr lines kept in a job result (StandardStreamBufferSize of core0)
+StreamBufferSize = 100
+
+
+class CommandError(Exception):
+    """
+    Raised by command handlers to fail a job, the message is returned as the job data
+    """
+
+    def __init__(self, msg, code=500):
+        super().__init__(msg)
+        self.code = code
+
+
+class Process:
+    """
+    Result of a process job (core.system, bash)
+    """
+
+    def __init__(self, stdout='', stderr='', code=0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.code = code
+
+
+class _Pool:
+    def __init__(self, commands, blocking):
+        self.commands = commands
+        self.blocking = blocking
+
+    def disconnect(self):
+        self.commands.disconnect()
+        self.blocking.disconnect()
+
+
+class FakeNode:
+    """
+    Fake zero-os node (check module documentation)
+    """
+
+    def __init__(self, host=None, port=6379, password=None, latency=0, latencies=None, sizes=None, workers=32,
+                 root=None):
+        """
+        :param host: redis-server host, if not set an embedded redis is used (requires fakeredis)
+        :param port: redis-server port
+        :param password: redis-server password
+        :param latency: time in seconds every job takes
+        :param latencies: dict of {command: seconds} to override the latency of some commands
+        :param sizes: dict of {command: count} to override the size of the synthetic results (check DefaultSizes)
+        :param workers: max number of jobs running at the same time
+        :param root: local directory where bash jobs really run, with the node files (check module documentation)
+        """
+        if host is None:
+            if fakeredis is None:
+                raise RuntimeError('embedded redis requires fakeredis, or give the host of a redis-server')
+            self._server = fakeredis.FakeServer()
+        else:
+            self._server = None
+
+        self._host = host
+        self._port = port
+        self._password = password
+        self._latency = latency
+        self._latencies = dict(latencies or {})
+        self._sizes = dict(DefaultSizes)
+        self._sizes.update(sizes or {})
+        self._workers = workers
+        self._root = root
+
+        self._redis = self._connect()
+        self._executor = None
+        self._stop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._shell_lock = threading.Lock()
+        self._queues = {}
+        # job id -> (done event, subscription streams) of the jobs that are not finished
+        self._running = {}
+
+        self._files = {}
+        self._fds = {}
+        self._containers = {}
+        self._container_id = 0
+
+        self._handlers = {
+            'core.ping': lambda args: 'PONG',
+            'core.system': self._system,
+            'bash': self._bash,
+            'info.cpu': self._info_cpu,
+            'info.mem': self._info_mem,
+            'info.os': self._info_os,
+            'info.nic': self._info_nic,
+            'info.disk': self._info_disk,
+            'info.version': lambda args: {'branch': 'fake', 'revision': '0000000', 'dirty': False},
+            'info.dmi': lambda args: {},
+            'info.port': lambda args: [],
+            'process.list': self._process_list,
+            'kvm.list': self._kvm_list,
+            'aggregator.query': self._aggregator_query,
+            'filesystem.open': self._fs_open,
+            'filesystem.read': self._fs_read,
+            'filesystem.write': self._fs_write,
+            'filesystem.close': self._fs_close,
+            'filesystem.exists': lambda args: args['path'] in self._files,
+            'filesystem.remove': self._fs_remove,
+            'filesystem.mkdir': lambda args: None,
+            'filesystem.list': self._fs_list,
+            'corex.list': self._corex_list,
+            'corex.find': self._corex_find,
+            'corex.terminate': self._corex_terminate,
+        }
+
+    def _connect(self):
+        if self._server is not None:
+            return fakeredis.FakeRedis(server=self._server)
+        return redis.Redis(host=self._host, port=self._port, password=self._password)
+
+    @property
+    def redis(self):
+        """
+        Redis connection of the node
+        """
+        return self._redis
+
+    @property
+    def files(self):
+        """
+        In memory filesystem of the node
+        :return: dict of {path: bytearray}
+        """
+        return self._files
+
+    def register(self, command, handler):
+        """
+        Add (or replace) a command handler
+
+        :param command: command name
+        :param handler: callable that gets the command arguments and returns the job data (json serializable),
+                        a Process object for process jobs, or raises CommandError to fail the job
+        """
+        self._handlers[command] = handler
+
+    def pool(self):
+        """
+        Connection pools to the node (check NodePool)
+        """
+        if self._server is None:
+            return NodePool(self._host, port=self._port, password=self._password, ssl=False)
+        return _Pool(fakeredis.FakeRedis(server=self._server).connection_pool,
+                     fakeredis.FakeRedis(server=self._server).connection_pool)
+
+    def client(self, **kwargs):
+        """
+        Create a client connected to this node
+
+        :param kwargs: extra Client keyword arguments
+        :return: Client
+        """
+        kwargs.setdefault('testConnectionAttempts', 0)
+        return Client(self._host or 'fakenode', port=self._port, password=self._password or '', ssl=False,
+                      pool=self.pool(), **kwargs)
+
+    def async_client(self, **kwargs):
+        """
+        Create an asyncio client connected to this node (requires redis>=4.2)
+
+        :param kwargs: extra AsyncClient keyword arguments
+        :return: AsyncClient
+        """
+        pool = None
+        if self._server is not None:
+            pool = fakeredis.FakeAsyncRedis(server=self._server).connection_pool
+        return AsyncClient(self._host or 'fakenode', port=self._port, password=self._password or '', ssl=False,
+                           pool=pool, **kwargs)
+
+    def start(self):
+        """
+        Start processing jobs in a background thread
+        """
+        if self._thread is not None:
+            return
+
+        self._executor = futures.ThreadPoolExecutor(max_workers=self._workers)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._consume, args=(self._stop,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop processing jobs, jobs that are already running are completed
+        """
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._thread = None
+        self._executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _consume(self, stop):
+        r = self._connect()
+        while not stop.is_set():
+            item = r.blpop('core:default', 1)
+            if item is None:
+                continue
+            self._submit(json.loads(item[1].decode()))
+
+    def _submit(self, job):
+        # the job is flagged as soon as it's picked from the queue, like core0 does
+        self._redis.rpush('result:{}:flag'.format(job['id']), '')
+        self._track(job)
+
+        queue = job.get('queue')
+        if not queue:
+            self._executor.submit(self._run, job)
+            return
+
+        # jobs on the same queue run in order
+        with self._lock:
+            pending = self._queues.get(queue)
+            if pending is not None:
+                pending.append(job)
+                return
+            self._queues[queue] = collections.deque()
+
+        self._executor.submit(self._run_queue, queue, job)
+
+    def _run_queue(self, queue, job):
+        while True:
+            self._run(job)
+            with self._lock:
+                pending = self._queues[queue]
+                if not pending:
+                    del self._queues[queue]
+                    return
+                job = pending.popleft()
+
+    def _track(self, job):
+        with self._lock:
+            self._running[job['id']] = (threading.Event(), [])
+
+    def _run(self, job, container=0):
+        start = time.time()
+        command = job['command']
+        result = {
+            'id': job['id'],
+            'command': command,
+            'data': '',
+            'streams': ['', ''],
+            'level': 20,
+            'state': 'SUCCESS',
+            'code': 0,
+            'starttime': int(start * 1000),
+            'time': 0,
+            'tags': job.get('tags'),
+            'container': container,
+        }
+
+        latency = self._latencies.get(command, self._latency)
+        if latency:
+            time.sleep(latency)
+
+        stream = []
+        try:
+            if command == 'corex.dispatch':
+                data = self._corex_dispatch(job['arguments'])
+            elif command == 'corex.create':
+                data = self._corex_create(job['arguments'], job.get('tags'))
+            elif command == 'core.subscribe':
+                data = self._subscribe(job['arguments'], job['id'])
+            else:
+                handler = self._handlers.get(command)
+                if handler is None:
+                    raise CommandError('unknown command {}'.format(command), 404)
+                data = handler(job['arguments'])
+
+            if isinstance(data, Process):
+                result['level'] = 0
+                result['streams'] = [_tail(data.stdout), _tail(data.stderr)]
+                result['code'] = data.code
+                if data.code != 0:
+                    result['state'] = 'ERROR'
+                stream = [(1, line) for line in data.stdout.splitlines(True)]
+                stream.extend((2, line) for line in data.stderr.splitlines(True))
+            else:
+                result['data'] = json.dumps(data)
+        except CommandError as e:
+            result.update(state='UNKNOWN_CMD' if e.code == 404 else 'ERROR', code=e.code, level=0, data=str(e))
+        except Exception as e:
+            result.update(state='ERROR', code=500, level=0, data=str(e))
+
+        result['time'] = int((time.time() - start) * 1000)
+
+        with self._lock:
+            done, subscriptions = self._running.pop(job['id'], (None, []))
+
+        pipe = self._redis.pipeline(transaction=False)
+        for queue in subscriptions:
+            for level, line in stream:
+                pipe.rpush(queue, _message(level, line))
+        if job.get('stream'):
+            queue = 'stream:{}'.format(job['id'])
+            for level, line in stream:
+                pipe.rpush(queue, _message(level, line))
+            eof = 0x2 if result['state'] == 'SUCCESS' else 0x4
+            pipe.rpush(queue, _message(30, '', eof))
+
+        queue = 'result:{}'.format(job['id'])
+        pipe.rpush(queue, json.dumps(result))
+        pipe.expire(queue, ResultExpire)
+        pipe.expire('{}:flag'.format(queue), ResultExpire)
+        pipe.execute()
+        if done is not None:
+            done.set()
+
+    def _subscribe(self, args, id):
+        with self._lock:
+            running = self._running.get(args['id'])
+            if running is None:
+                raise CommandError("job '{}' does not exist".format(args['id']))
+            done, subscriptions = running
+            subscriptions.append('stream:{}'.format(id))
+
+        done.wait()
+        return None
+
+    # process commands
+    def _lines(self, name):
+        return ''.join('{} output line {}\n'.format(name, i) for i in range(self._sizes['lines']))
+
+    def _system(self, args):
+        return Process(stdout=self._lines(args['name']))
+
+    def _bash(self, args):
+        if self._root is None:
+            return Process(stdout=self._lines('bash'))
+
+        with self._shell_lock:
+            self._export()
+            try:
+                process = subprocess.run(['bash', '-c', args['script']], cwd=self._root,
+                                         input=(args.get('stdin') or '').encode(),
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            finally:
+                self._import()
+
+        return Process(stdout=process.stdout.decode(errors='replace'), stderr=process.stderr.decode(errors='replace'),
+                       code=process.returncode)
+
+    def _local(self, path):
+        return os.path.join(self._root, path.lstrip('/'))
+
+    def _local_files(self):
+        for dir, _, names in os.walk(self._root):
+            for name in names:
+                yield os.path.join(dir, name)
+
+    def _export(self):
+        """
+        Make the root directory a copy of the node files
+        """
+        files = {self._local(path): data for path, data in self._files.items()}
+        for local in list(self._local_files()):
+            if local not in files:
+                os.remove(local)
+        for local, data in files.items():
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            with open(local, 'wb') as file:
+                file.write(data)
+
+    def _import(self):
+        """
+        Load the node files back from the root directory, after a script changed them
+        """
+        paths = {self._local(path): path for path in self._files}
+        files = {}
+        for local in self._local_files():
+            with open(local, 'rb') as file:
+                files[paths.get(local, os.path.relpath(local, self._root))] = bytearray(file.read())
+        self._files.clear()
+        self._files.update(files)
+
+    # info commands
+    def _info_cpu(self, args):
+        return [{
+            'cpu': i, 'vendorId': 'GenuineIntel', 'family': '6', 'model': '85', 'stepping': 4,
+            'physicalId': '0', 'coreId': str(i), 'cores': 1, 'modelName': 'Fake CPU', 'mhz': 2100,
+            'cacheSize': 33792, 'flags': ['fpu', 'vme', 'de', 'pse', 'tsc'],
+        } for i in range(4)]
+
+    def _info_mem(self, args):
+        return {
+            'total': 16 * 1024 ** 3, 'available': 8 * 1024 ** 3, 'used': 8 * 1024 ** 3,
+            'usedPercent': 50.0, 'free': 8 * 1024 ** 3,
+        }
+
+    def _info_os(self, args):
+        return {
+            'hostname': 'fakenode', 'uptime': 3600, 'bootTime': int(time.time()) - 3600, 'procs': 100,
+            'os': 'linux', 'platform': 'zero-os', 'platformFamily': 'zero-os', 'platformVersion': 'fake',
+            'kernelVersion': '4.14', 'virtualizationSystem': '', 'virtualizationRole': '',
+            'hostid': 'fake',
+        }
+
+    def _info_nic(self, args):
+        return [{
+            'name': 'eth{}'.format(i), 'mtu': 1500, 'hardwareaddr': '52:54:00:00:00:{:02x}'.format(i),
+            'flags': ['up', 'broadcast', 'multicast'], 'addrs': [{'addr': '10.0.{}.2/24'.format(i)}],
+        } for i in range(self._sizes['info.nic'])]
+
+    def _info_disk(self, args):
+        return [{
+            'device': '/dev/sd{}1'.format(chr(ord('a') + i)), 'mountpoint': '/mnt/disk{}'.format(i),
+            'fstype': 'btrfs', 'opts': 'rw,relatime',
+        } for i in range(self._sizes['info.disk'])]
+
+    def _process_list(self, args):
+        return [{
+            'pid': i, 'ppid': 1, 'cmdline': '/usr/bin/fake-daemon --instance {}'.format(i),
+            'createtime': 1530000000000 + i, 'cpu': 0.5, 'rss': 1024 * i, 'vms': 4096 * i, 'swap': 0,
+        } for i in range(self._sizes['process.list'])]
+
+    def _kvm_list(self, args):
+        return [{
+            'id': i, 'uuid': str(uuid.UUID(int=i)), 'name': 'vm-{}'.format(i), 'state': 'running',
+            'vnc': 5900 + i, 'tags': None, 'ifctargets': [], 'default_ip': '',
+            'params': {'cpu': 2, 'memory': 2048, 'media': [], 'nics': [], 'port': {}},
+        } for i in range(self._sizes['kvm.list'])]
+
+    def _aggregator_query(self, args):
+        now = int(time.time())
+        return {'machine.CPU.percent/{}'.format(i): {
+            'op': 'A', 'last_value': float(i % 100), 'last_time': now, 'tags': [],
+            'current': {
+                '300': {'avg': 10.5, 'max': 90.1, 'min': 0.1, 'start': now - now % 300, 'total': 3150.2, 'count': 30},
+            },
+            'history': {},
+        } for i in range(self._sizes['aggregator.query'])}
+
+    # filesystem commands
+    def _fs_open(self, args):
+        path, mode = args['file'], args.get('mode', 'r')
+        if 'r' in mode and 'w' not in mode and path not in self._files:
+            raise CommandError('open {}: no such file or directory'.format(path))
+        if 'w' in mode or path not in self._files:
+            self._files[path] = bytearray()
+        fd = str(uuid.uuid4())
+        self._fds[fd] = [path, len(self._files[path]) if 'a' in mode else 0]
+        return fd
+
+    def _fd(self, args):
+        fd = self._fds.get(args['fd'])
+        if fd is None:
+            raise CommandError("unknown file description '{}'".format(args['fd']))
+        return fd
+
+    def _fs_read(self, args):
+        fd = self._fd(args)
+        data = self._files[fd[0]]
+        block = bytes(data[fd[1]:fd[1] + ReadBlockSize])
+        fd[1] += len(block)
+        return base64.b64encode(block).decode()
+
+    def _fs_write(self, args):
+        fd = self._fd(args)
+        block = base64.b64decode(args['block'])
+        data = self._files[fd[0]]
+        data[fd[1]:fd[1] + len(block)] = block
+        fd[1] += len(block)
+        return None
+
+    def _fs_close(self, args):
+        self._fds.pop(args['fd'], None)
+        return None
+
+    def _fs_remove(self, args):
+        self._files.pop(args['path'], None)
+        return None
+
+    def _fs_list(self, args):
+        prefix = args['path'].rstrip('/') + '/'
+        return [{
+            'name': path[len(prefix):], 'size': len(data), 'mode': 420, 'is_dir': False,
+        } for path, data in self._files.items() if path.startswith(prefix) and '/' not in path[len(prefix):]]
+
+    # container commands
+    def _corex_create(self, args, tags):
+        with self._lock:
+            self._container_id += 1
+            id = self._container_id
+        arguments = dict(args, tags=tags)
+        self._containers[id] = {
+            'cpu': 0.0, 'rss': 0, 'vms': 0, 'swap': 0, 'pid': 1000 + id,
+            'container': {'arguments': arguments, 'root': '/mnt/containers/{}'.format(id), 'pid': 1000 + id},
+        }
+        return id
+
+    def _corex_list(self, args):
+        return {str(id): info for id, info in self._containers.items()}
+
+    def _corex_find(self, args):
+        tags = set(args.get('tags') or [])
+        return {
+            str(id): info for id, info in self._containers.items()
+            if tags.issubset(info['container']['arguments'].get('tags') or [])
+        }
+
+    def _corex_terminate(self, args):
+        if self._containers.pop(args['container'], None) is None:
+            raise CommandError('no container with id {}'.format(args['container']))
+        return None
+
+    def _corex_dispatch(self, args):
+        container = args['container']
+        if container not in self._containers:
+            raise CommandError('container does not exist')
+
+        job = dict(args['command'])
+        if not job.get('id'):
+            job['id'] = str(uuid.uuid4())
+
+        self._redis.rpush('result:{}:flag'.format(job['id']), '')
+        self._track(job)
+        self._executor.submit(self._run, job, container)
+        return job['id']
+
+
+def _message(level, line, flags=0):
+    return json.dumps({'message': {'message': line, 'meta': (level << 16) | flags}})
+
+
+def _tail(output):
+    lines = output.splitlines(True)
+    if len(lines) <= StreamBufferSize:
+        return output
+    return ''.join(lines[-StreamBufferSize:])
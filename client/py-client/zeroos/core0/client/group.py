@@ -0,0 +1,267 @@
+import time
+from concurrent import futures
+
+
+class GroupError(RuntimeError):
+    def __init__(self, errors):
+        super().__init__('command failed on {} target(s): {}'.format(
+            len(errors), ', '.join(str(name) for name in errors)
+        ))
+        self._errors = errors
+
+    @property
+    def errors(self):
+        """
+        Errors per failing node
+        :return: dict of {name: exception}
+        """
+        return self._errors
+
+
+class GroupResult:
+    """
+    Outcome of a command dispatched on a ClientGroup (or of a batch operation like
+    ContainerManager.create_many). Each node (or batch item) either has a result or
+    an error (exception), never both.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._errors = {}
+        self._elapsed = 0
+
+    @property
+    def results(self):
+        """
+        Results of the nodes where the command succeeded
+        :return: dict of {name: result}
+        """
+        return self._results
+
+    @property
+    def errors(self):
+        """
+        Errors of the nodes where the command failed (or timed out)
+        :return: dict of {name: exception}
+        """
+        return self._errors
+
+    @property
+    def ok(self):
+        """
+        True if the command succeeded on all nodes
+        """
+        return len(self._errors) == 0
+
+    @property
+    def elapsed(self):
+        """
+        Wall time of the whole group call in seconds
+        """
+        return self._elapsed
+
+    def raise_for_errors(self):
+        """
+        Raise a GroupError if the command failed on any of the nodes
+        """
+        if self._errors:
+            raise GroupError(self._errors)
+
+    def __getitem__(self, name):
+        if name in self._errors:
+            raise self._errors[name]
+        return self._results[name]
+
+    def __contains__(self, name):
+        return name in self._results or name in self._errors
+
+    def __len__(self):
+        return len(self._results) + len(self._errors)
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return 'GroupResult(results={}, errors={})'.format(sorted(self._results), self._errors)
+
+
+class ClientGroup:
+    """
+    Holds many client connections (usually one per node) and dispatches the same command
+    to all of them concurrently, so the wall time of a call is bounded by the slowest node
+    instead of the sum over all nodes.
+
+    example:
+        group = ClientGroup({
+            'node1': Client('10.0.0.1'),
+            'node2': Client('10.0.0.2'),
+        })
+
+        mem = group.json('info.mem', {})
+        for name, info in mem.results.items():
+            print(name, info['available'])
+
+        for name, err in mem.errors.items():
+            print(name, 'failed', err)
+
+        # any manager call can be dispatched with map
+        containers = group.map(lambda cl: cl.container.list(), timeout=30)
+
+    The timeout of all the methods applies to each node separately, counted from the moment the call on that
+    node starts.
+    """
+
+    def __init__(self, clients=None, max_workers=None):
+        """
+        :param clients: dict of {name: client}
+        :param max_workers: max number of nodes to talk to at the same time (default to the number of nodes)
+        """
+        self._clients = dict(clients or {})
+        self._max_workers = max_workers
+        self._executor = None
+        self._workers = 0
+
+    @property
+    def clients(self):
+        """
+        dict of {name: client}
+        """
+        return self._clients
+
+    def add(self, name, client):
+        """
+        Add a client to the group
+
+        :param name: node name (must be unique in the group)
+        :param client: client object
+        """
+        if name in self._clients:
+            raise ValueError('a client with name "{}" already exists'.format(name))
+        self._clients[name] = client
+
+    def remove(self, name):
+        """
+        Remove a client from the group
+        :param name: node name
+        """
+        self._clients.pop(name)
+
+    def _pool(self):
+        workers = self._max_workers or max(len(self._clients), 1)
+        if self._executor is None or self._workers < workers:
+            # the group grew, calls still running on the previous pool complete there
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = futures.ThreadPoolExecutor(max_workers=workers)
+            self._workers = workers
+        return self._executor
+
+    def map(self, fn, timeout=None):
+        """
+        Call fn(client) for each client in the group concurrently
+
+        :note: a call can't be interrupted, so a node that times out keeps its worker thread busy until fn returns.
+               Make fn give up on its own (like Response.get(timeout)) when the node might not answer.
+
+        :param fn: callable that accepts a client object
+        :param timeout: max time in seconds to wait for each node, counted from the moment fn is called for this
+                        node. nodes that didn't finish in time are reported with a TimeoutError
+        :return: GroupResult
+        """
+        start = time.time()
+        result = GroupResult()
+        started = {}
+
+        def call(name, client):
+            started[name] = time.time()
+            return fn(client)
+
+        pending = {}
+        pool = self._pool()
+        for name, client in self._clients.items():
+            pending[pool.submit(call, name, client)] = name
+
+        while pending:
+            wait = None
+            if timeout is not None:
+                now = time.time()
+                for future, name in list(pending.items()):
+                    if name in started and not future.done() and now - started[name] >= timeout:
+                        del pending[future]
+                        result.errors[name] = TimeoutError('timed out after {}s'.format(timeout))
+                if not pending:
+                    break
+                deadlines = [started[name] + timeout for name in pending.values() if name in started]
+                wait = max(0, min(deadlines) - now) if deadlines else timeout
+
+            done, _ = futures.wait(pending, timeout=wait, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                err = future.exception()
+                if err is not None:
+                    result.errors[name] = err
+                else:
+                    result.results[name] = future.result()
+
+        result._elapsed = time.time() - start
+        return result
+
+    def raw(self, command, arguments, timeout=None, **kwargs):
+        """
+        Run a command on all nodes and gather the Return objects (check Client.raw)
+
+        :param command: Command name to execute
+        :param arguments: command arguments
+        :param timeout: per node client side timeout in seconds (default to the client timeout)
+        :param kwargs: extra keyword arguments accepted by Client.raw (queue, max_time, tags, etc...)
+        :return: GroupResult of Return objects
+        """
+        return self.map(lambda client: client.raw(command, arguments, **kwargs).get(timeout))
+
+    def json(self, command, arguments, tags=None, timeout=None):
+        """
+        Same as self.raw except it assumes the returned results are json (check JSONResponse.get)
+
+        :param timeout: per node client side timeout in seconds (default to the client timeout)
+        :return: GroupResult of loaded data
+        """
+        from .client import JSONResponse  # client.py imports this module
+
+        return self.map(lambda client: JSONResponse(client.raw(command, arguments, tags=tags)).get(timeout))
+
+    def system(self, command, timeout=None, **kwargs):
+        """
+        Execute a command on all nodes and gather the Return objects (check Client.system)
+
+        :param command: command to execute (with its arguments) ex: `ls -l /root`
+        :param timeout: per node client side timeout in seconds (default to the client timeout)
+        :return: GroupResult of Return objects
+        """
+        return self.map(lambda client: client.system(command, **kwargs).get(timeout))
+
+    def bash(self, script, timeout=None, **kwargs):
+        """
+        Execute a bash script on all nodes and gather the Return objects (check Client.bash)
+
+        :param script: Script to execute
+        :param timeout: per node client side timeout in seconds (default to the client timeout)
+        :return: GroupResult of Return objects
+        """
+        return self.map(lambda client: client.bash(script, **kwargs).get(timeout))
+
+    def ping(self, timeout=None):
+        """
+        Ping all nodes
+
+        :param timeout: per node client side timeout in seconds (default to the client timeout)
+        :return: GroupResult
+        """
+        return self.json('core.ping', {}, timeout=timeout)
+
+    def close(self):
+        """
+        Stop the worker threads of the group
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,157 @@
+"""
+Local mirrors of the node containers and virtual machines, that report what changed between polls
+"""
+import time
+
+
+def container_fingerprint(info):
+    """
+    Fingerprint of a corex.list entry, the runtime stats (cpu, rss, etc...) that change on every
+    poll are not part of it
+    """
+    return info.get('container')
+
+
+class InventoryDiff:
+    """
+    Changes between two polls of an inventory
+    """
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self._added = added or {}
+        self._removed = removed or {}
+        self._changed = changed or {}
+
+    @property
+    def added(self):
+        """
+        New entries
+        :return: dict of {id: entry}
+        """
+        return self._added
+
+    @property
+    def removed(self):
+        """
+        Entries that are gone
+        :return: dict of {id: last known entry}
+        """
+        return self._removed
+
+    @property
+    def changed(self):
+        """
+        Entries whose fingerprint changed
+        :return: dict of {id: (old entry, new entry)}
+        """
+        return self._changed
+
+    def __bool__(self):
+        return bool(self._added or self._removed or self._changed)
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return 'InventoryDiff(added={}, removed={}, changed={})'.format(
+            sorted(self._added), sorted(self._removed), sorted(self._changed)
+        )
+
+
+class Inventory:
+    """
+    Keeps a local mirror of a list command (corex.list, kvm.list) and computes the diff with the
+    previous poll, so consumers can react to changes instead of rescanning the full list.
+
+    The node has no incremental api so every poll still transfers the full list, but a poll whose result
+    is identical to the previous one is not decoded at all, and entries are compared on a fingerprint
+    that leaves out the fields that change on every poll (like the container runtime stats).
+
+    example:
+        inventory = cl.container.inventory()
+        for diff in inventory.follow(5):
+            for id in diff.added:
+                print('container', id, 'started')
+            for id in diff.removed:
+                print('container', id, 'gone')
+    """
+
+    def __init__(self, client, command, key=None, fingerprint=None):
+        """
+        :param client: client to poll
+        :param command: list command, returning a dict of {id: entry} or a list of entries
+        :param key: name of the entry id field if the command returns a list
+        :param fingerprint: callable that returns the comparable part of an entry (default to the entry itself)
+        """
+        self._client = client
+        self._command = command
+        self._key = key
+        self._fingerprint = fingerprint or (lambda entry: entry)
+        self._data = None
+        self._items = {}
+        self._fingerprints = {}
+
+    @property
+    def items(self):
+        """
+        Entries as of the last poll
+        :return: dict of {id: entry}
+        """
+        return self._items
+
+    def poll(self):
+        """
+        Fetch the list from the node and update the mirror
+
+        :return: InventoryDiff against the previous poll (the first poll reports all entries as added)
+        """
+        return self._update(self._client.sync(self._command, {}))
+
+    def _update(self, result):
+        """
+        Update the mirror from a list command result
+        """
+        if result.level != 20:
+            raise RuntimeError('invalid result level, expecting json(20) got (%d)' % result.level)
+
+        if result.data == self._data:
+            return InventoryDiff()
+
+        entries = result.json()
+        if self._key is not None:
+            entries = {entry[self._key]: entry for entry in entries or []}
+        elif entries is None:
+            entries = {}
+
+        previous = self._items
+        fingerprints = {}
+        added = {}
+        changed = {}
+        for id, entry in entries.items():
+            fingerprint = self._fingerprint(entry)
+            fingerprints[id] = fingerprint
+            if id not in previous:
+                added[id] = entry
+            elif self._fingerprints[id] != fingerprint:
+                changed[id] = (previous[id], entry)
+
+        removed = {id: entry for id, entry in previous.items() if id not in entries}
+
+        self._data = result.data
+        self._items = entries
+        self._fingerprints = fingerprints
+        return InventoryDiff(added, removed, changed)
+
+    def follow(self, interval=5):
+        """
+        Poll the node every interval seconds and yield the non empty diffs
+
+        :param interval: seconds between polls
+        :return: generator of InventoryDiff
+        """
+        while True:
+            start = time.monotonic()
+            diff = self.poll()
+            if diff:
+                yield diff
+            time.sleep(max(0, interval - (time.monotonic() - start)))
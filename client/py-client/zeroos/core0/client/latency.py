@@ -0,0 +1,270 @@
+"""
+Client side latency histograms of the jobs, per command and per phase
+"""
+import math
+import threading
+
+# default bucket boundaries in seconds of the OpenMetrics export
+DefaultBuckets = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300,
+)
+
+# phases of a job, check LatencyRecorder
+Phases = ('submit', 'queue', 'exec', 'total')
+
+
+class Histogram:
+    """
+    HDR style histogram of durations.
+
+    Durations are counted in microseconds in log-linear buckets: every power of two range is split in
+    2^(precision-1) linear sub buckets, so the relative error of any recorded value (and percentile) is
+    below 1/2^(precision-1) whatever its magnitude, with a memory use that only grows with the log of the
+    recorded range.
+    """
+    __slots__ = ('_precision', '_counts', '_count', '_sum', '_min', '_max')
+
+    def __init__(self, precision=7):
+        """
+        :param precision: number of significant bits kept per value (7 is < 1.6% error)
+        """
+        self._precision = precision
+        self._counts = {}
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    @property
+    def count(self):
+        """
+        Number of recorded values
+        """
+        return self._count
+
+    @property
+    def sum(self):
+        """
+        Sum of the recorded values in seconds
+        """
+        return self._sum
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def mean(self):
+        if not self._count:
+            return None
+        return self._sum / self._count
+
+    def record(self, seconds):
+        """
+        Record a duration, negative durations (clock adjustments) are counted as 0
+
+        :param seconds: duration in seconds
+        """
+        seconds = max(0.0, seconds)
+        index = self._index(int(seconds * 1000000))
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self._count += 1
+        self._sum += seconds
+        if self._min is None or seconds < self._min:
+            self._min = seconds
+        if self._max is None or seconds > self._max:
+            self._max = seconds
+
+    def percentile(self, q):
+        """
+        q-th percentile (0-100) of the recorded values
+
+        :return: highest value (in seconds) of the bucket that holds the percentile, or None if empty
+        """
+        if not self._count:
+            return None
+
+        rank = max(1, int(math.ceil(self._count * q / 100)))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(self._upper(index) / 1000000, self._max)
+        return self._max
+
+    def cumulative(self, buckets=DefaultBuckets):
+        """
+        Number of values below or equal to each boundary
+
+        :param buckets: ascending boundaries in seconds
+        :return: list of counts, one per boundary
+        """
+        counts = [0] * len(buckets)
+        for index, count in self._counts.items():
+            value = self._upper(index) / 1000000
+            for i, boundary in enumerate(buckets):
+                if value <= boundary:
+                    counts[i] += count
+                    break
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+        return counts
+
+    def _index(self, value):
+        shift = value.bit_length() - self._precision
+        if shift <= 0:
+            return value
+        return (shift << (self._precision - 1)) + (value >> shift)
+
+    def _upper(self, index):
+        if index < 1 << self._precision:
+            return index
+        shift = (index >> (self._precision - 1)) - 1
+        sub = index - (shift << (self._precision - 1))
+        return ((sub + 1) << shift) - 1
+
+
+class LatencyRecorder:
+    """
+    Records the latency of every job waited on, per command name, split in phases:
+
+    - submit: from pushing the job to core:default until the node confirms it picked it up (the queued flag),
+              that is the network round trip plus the backlog of core:default
+    - queue: time the job was known to the node without executing (waiting behind other jobs of the same
+             queue, and the delivery of the result)
+    - exec: execution time as reported by the node
+    - total: from pushing the job until the client received its result
+
+    All phases except exec are measured on the client clock so they don't depend on the node clock. The
+    completion is when the client reads the result, so a job that is waited on long after it finished
+    reports that delay in its queue and total phases.
+
+    example:
+        cl = Client('10.0.0.1', latency=True)
+        cl.system('ls').get()
+        cl.latency.histogram('core.system', 'submit').percentile(99)
+        print(cl.latency.openmetrics())
+    """
+
+    def __init__(self, precision=7, buckets=DefaultBuckets):
+        """
+        :param precision: histograms precision (check Histogram)
+        :param buckets: bucket boundaries in seconds of the OpenMetrics export
+        """
+        self._precision = precision
+        self._buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, command, submitted, queued, completed, exec_time):
+        """
+        Record the timings of a single job
+
+        :param command: command name
+        :param submitted: monotonic time the job was pushed
+        :param queued: monotonic time the queued flag was received
+        :param completed: monotonic time the result was received
+        :param exec_time: execution time in seconds as reported by the node (None if unknown)
+        """
+        with self._lock:
+            histograms = self._histograms.get(command)
+            if histograms is None:
+                histograms = {phase: Histogram(self._precision) for phase in Phases}
+                self._histograms[command] = histograms
+
+            histograms['submit'].record(queued - submitted)
+            histograms['total'].record(completed - submitted)
+            if exec_time is not None:
+                histograms['exec'].record(exec_time)
+                histograms['queue'].record(completed - queued - exec_time)
+
+    def commands(self):
+        """
+        Recorded command names
+        :return: list of str
+        """
+        with self._lock:
+            return sorted(self._histograms)
+
+    def histogram(self, command, phase='total'):
+        """
+        Histogram of a command phase
+
+        :param command: command name
+        :param phase: one of submit, queue, exec, total
+        :return: Histogram or None if the command was never recorded
+        """
+        if phase not in Phases:
+            raise ValueError('invalid phase {}, expecting one of {}'.format(phase, ', '.join(Phases)))
+
+        with self._lock:
+            histograms = self._histograms.get(command)
+            return histograms[phase] if histograms is not None else None
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Summary of all recorded commands
+
+        :param percentiles: percentiles to include
+        :return: dict of {command: {phase: {count, mean, max, p50, p90, ...}}} with durations in seconds
+        """
+        with self._lock:
+            summary = {}
+            for command, histograms in self._histograms.items():
+                phases = summary.setdefault(command, {})
+                for phase, histogram in histograms.items():
+                    stats = {'count': histogram.count, 'mean': histogram.mean, 'max': histogram.max}
+                    for q in percentiles:
+                        stats['p{}'.format(q)] = histogram.percentile(q)
+                    phases[phase] = stats
+            return summary
+
+    def reset(self):
+        """
+        Drop all the recorded values
+        """
+        with self._lock:
+            self._histograms.clear()
+
+    def openmetrics(self, name='core0_client_job_latency_seconds', labels=None):
+        """
+        Export the histograms in the OpenMetrics text format
+
+        :param name: metric family name
+        :param labels: extra labels added to every sample (like {'node': '10.0.0.1'})
+        :return: str
+        """
+        extra = ''.join('{}="{}",'.format(key, _escape(value)) for key, value in sorted((labels or {}).items()))
+        lines = [
+            '# TYPE {} histogram'.format(name),
+            '# UNIT {} seconds'.format(name),
+            '# HELP {} Latency of the core0 jobs per command and phase.'.format(name),
+        ]
+
+        with self._lock:
+            for command in sorted(self._histograms):
+                for phase in Phases:
+                    histogram = self._histograms[command][phase]
+                    if not histogram.count:
+                        continue
+                    base = '{}command="{}",phase="{}"'.format(extra, _escape(command), phase)
+                    for boundary, count in zip(self._buckets, histogram.cumulative(self._buckets)):
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, base, _float(boundary), count))
+                    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, base, histogram.count))
+                    lines.append('{}_count{{{}}} {}'.format(name, base, histogram.count))
+                    lines.append('{}_sum{{{}}} {}'.format(name, base, repr(histogram.sum)))
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _float(value):
+    return repr(float(value))
@@ -195,12 +195,29 @@ class Checker:
     """
     def __init__(self, tyepdef):
         self._typ = tyepdef
+        self._valid = None
 
     def check(self, object, tracker=None):
         if tracker is None:
+            # fast path, the compiled validator only tells if the object is valid. The full
+            # check (that builds the path and reason of the failure) only runs on invalid objects.
+            if self._valid is None:
+                self._valid = _compile(self._typ)
+            if self._valid(object):
+                return
             tracker = Tracker([]).push('/')
         return self._check(self._typ, object, tracker)
 
+    def valid(self, object):
+        """
+        Same as check, but returns a bool instead of raising an exception
+
+        :return: True if object is valid
+        """
+        if self._valid is None:
+            self._valid = _compile(self._typ)
+        return self._valid(object)
+
     def _check_list(self, typ, obj_list, t):
         for i, elem in enumerate(obj_list):
             tx = t.push('[{}]'.format(i))
@@ -245,4 +262,98 @@ class Checker:
                 raise t.reason('expecting a dict')
             self._check_dict(typ, object, t)
         elif atyp != typ:
-            raise t.reason('invalid type, expecting {}'.format(typ))
\ No newline at end of file
+            raise t.reason('invalid type, expecting {}'.format(typ))
+
+
+def _compile(typ):
+    """
+    Compile a type-def into a validator function (object -> bool) that accepts exactly the same
+    objects as Checker._check
+    """
+    cls = type(typ)
+    if cls is Any:
+        return lambda object: True
+    elif cls is IsNone:
+        return lambda object: object is None
+    elif cls is Missing:
+        return lambda object: not (object != missing)
+    elif cls is Enum:
+        valid = typ._valid
+        return lambda object: isinstance(object, str) and object in valid
+    elif cls is Or:
+        branches = tuple(chk.valid for chk in typ._checkers)
+
+        def check_or(object):
+            for branch in branches:
+                if branch(object):
+                    return True
+            return False
+        return check_or
+    elif cls is Length:
+        inner, min, max = typ._checker.valid, typ._min, typ._max
+
+        def check_length(object):
+            if not inner(object):
+                return False
+            if min is not None and len(object) < min:
+                return False
+            if max is not None and len(object) > max:
+                return False
+            return True
+        return check_length
+    elif cls is Map:
+        key, value = typ._key.valid, typ._value.valid
+
+        def check_map(object):
+            if not isinstance(object, dict):
+                return False
+            for k, v in object.items():
+                if not key(k) or not value(v):
+                    return False
+            return True
+        return check_map
+    elif isinstance(typ, Option):
+        # custom options are validated through their own check method
+        def check_option(object):
+            try:
+                typ.check(object, Tracker([]))
+            except Tracker:
+                return False
+            return True
+        return check_option
+    elif cls is list or cls is tuple:
+        elem = _compile(typ[0])
+
+        def check_sequence(object):
+            if type(object) is not cls:
+                return False
+            for e in object:
+                if not elem(e):
+                    return False
+            return True
+        return check_sequence
+    elif cls is dict:
+        fields = {}
+        required = []
+        for name, attr_type in typ.items():
+            fields[name] = _compile(attr_type)
+            if not fields[name](missing):
+                required.append(name)
+        size = len(fields)
+
+        def check_dict(object):
+            if type(object) is not dict:
+                return False
+            for name, value in object.items():
+                field = fields.get(name)
+                if field is None or not field(value):
+                    return False
+            if len(object) == size:
+                return True
+            for name in required:
+                if name not in object:
+                    return False
+            return True
+        return check_dict
+
+    return lambda object: type(object) == typ